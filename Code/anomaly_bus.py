@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# Esito di publish(): accodate, coalescate (volute), scartate per coda piena
+PublishResult = namedtuple("PublishResult", ["queued", "coalesced", "dropped"])
+
+
+class AnomalyBus:
+    """Bounded queue of anomalies between the detector and the mitigator.
+
+    Anomalies are keyed by (dpid, key). A new report for a key that is
+    still queued is merged into the queued one, and a report for a key
+    dispatched less than `coalesce_window` seconds ago is dropped, so a
+    detection storm yields one action per flow. When `max_pending` keys
+    are queued, publishers wait up to their timeout for the consumer to
+    catch up and then drop the rest.
+    """
+
+    def __init__(self, max_pending=10000, coalesce_window=5):
+        self.max_pending = max_pending
+        self.coalesce_window = coalesce_window
+        self._pending = OrderedDict()  # (dpid, key) -> anomalia
+        self._recent = OrderedDict()  # (dpid, key) -> istante di consegna
+        self._cond = threading.Condition()
+        self.published = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.dispatched = 0
+        self.batches = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    @staticmethod
+    def _key(anomaly):
+        return (anomaly.get("dpid"), anomaly.get("key"))
+
+    def _expire_recent(self, now):
+        recent = self._recent
+        while recent:
+            key, dispatched_at = next(iter(recent.items()))
+            if now - dispatched_at < self.coalesce_window:
+                break
+            del recent[key]
+
+    def publish(self, anomalies, timeout=0.5, now=None):
+        """Queue a batch of anomalies; return a PublishResult.
+
+        Reports merged into a queued anomaly or already handled within
+        `coalesce_window` count as coalesced; only reports refused because
+        the queue stayed full count as dropped.
+        """
+        now = time.time() if now is None else now
+        deadline = time.monotonic() + timeout
+        queued_count = coalesced = dropped = 0
+        with self._cond:
+            self._expire_recent(now)
+            for anomaly in anomalies:
+                self.published += 1
+                key = self._key(anomaly)
+                queued = self._pending.get(key)
+                if queued is not None:
+                    queued["reports"] = queued.get("reports", 1) + 1
+                    queued["throughput"] = max(
+                        queued.get("throughput", 0), anomaly.get("throughput", 0)
+                    )
+                    coalesced += 1
+                    continue
+                if key in self._recent:
+                    coalesced += 1  # gia' gestita nella finestra
+                    continue
+                while len(self._pending) >= self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                if len(self._pending) >= self.max_pending:
+                    dropped += 1
+                    continue
+                self._pending[key] = dict(anomaly)
+                queued_count += 1
+            self.coalesced += coalesced
+            self.dropped += dropped
+            if self._pending:
+                self._cond.notify_all()
+        return PublishResult(queued_count, coalesced, dropped)
+
+    def consume(self, max_batch=256, timeout=1.0, now=None):
+        """Wait up to `timeout` for anomalies; return at most `max_batch`."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            now = time.time() if now is None else now
+            batch = []
+            while self._pending and len(batch) < max_batch:
+                key, anomaly = self._pending.popitem(last=False)
+                self._recent[key] = now
+                self._recent.move_to_end(key)
+                batch.append(anomaly)
+            if batch:
+                self.dispatched += len(batch)
+                self.batches += 1
+                self._cond.notify_all()  # spazio libero per i publisher
+            return batch
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "max_pending": self.max_pending,
+                "coalesce_window": self.coalesce_window,
+                "published": self.published,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "dispatched": self.dispatched,
+                "batches": self.batches,
+            }
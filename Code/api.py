@@ -2,6 +2,8 @@ from flask import Flask, request, jsonify
 import threading
 import logging
 
+from logging_utils import logging_stats
+
 
 def start_api_server(mitigator, host="0.0.0.0", port=5000):
     app = Flask(__name__)
@@ -22,13 +24,22 @@ def start_api_server(mitigator, host="0.0.0.0", port=5000):
             ]
         )
         # Qui puoi aggiungere validazione dei parametri
-        # Si assume che il controller abbia accesso a un datapath (es. il primo disponibile)
+        # Il drop va sullo switch di accesso della sorgente; il primo
+        # datapath e' solo il ripiego se la sorgente non e' ancora nota
         datapath = next(iter(mitigator.controller.dps.values()), None)
         if not datapath:
             return jsonify({"error": "No datapath available"}), 400
-        mitigator.apply_block(datapath, flow_id)
+        info = mitigator.apply_block(datapath, flow_id)
         logger.info(f"Blocco richiesto via API: {flow_id}")
-        return jsonify({"status": "blocked", "flow_id": flow_id})
+        return jsonify(
+            {
+                "status": "blocked",
+                "flow_id": flow_id,
+                "dpid": info["dpid"],
+                "in_port": info["in_port"],
+                "placement": info["placement"],
+            }
+        )
 
     @app.route("/unblock", methods=["POST"])
     def unblock_flow():
@@ -44,20 +55,57 @@ def start_api_server(mitigator, host="0.0.0.0", port=5000):
                 "udp_dst",
             ]
         )
-        with mitigator.lock:
-            if flow_id in mitigator.blocked_flows:
-                del mitigator.blocked_flows[flow_id]
-                logger.info(f"Sblocco richiesto via API: {flow_id}")
-                return jsonify({"status": "unblocked", "flow_id": flow_id})
-            else:
-                return jsonify({"error": "Flow not blocked"}), 404
+        if mitigator.unblock_flow(flow_id):
+            logger.info(f"Sblocco richiesto via API: {flow_id}")
+            return jsonify({"status": "unblocked", "flow_id": flow_id})
+        else:
+            return jsonify({"error": "Flow not blocked"}), 404
 
     @app.route("/blocked", methods=["GET"])
     def get_blocked():
-        with mitigator.lock:
-            blocked = {str(k): v for k, v in mitigator.blocked_flows.items()}
+        # Copia presa sotto lock, serializzata senza bloccare il packet-in
+        blocked = {str(k): v for k, v in mitigator.get_blocked_flows().items()}
         return jsonify(blocked)
 
+    @app.route("/verdict-cache", methods=["GET"])
+    def get_verdict_cache():
+        """Hit/miss counters of the should_block verdict cache."""
+        return jsonify(mitigator.cache_stats())
+
+    @app.route("/hosts", methods=["GET"])
+    def get_host_stats():
+        return jsonify(mitigator.controller.hosts.stats())
+
+    @app.route("/block-stats", methods=["GET"])
+    def get_block_stats():
+        # Drop installati e reinstallazioni evitate
+        return jsonify(mitigator.block_stats())
+
+    @app.route("/rules", methods=["GET"])
+    def get_rule_budget():
+        # Drop per switch, aggregati wildcard e decisioni di compattazione
+        return jsonify(mitigator.rule_budget.stats())
+
+    @app.route("/flow-mods", methods=["GET"])
+    def get_flow_mod_stats():
+        # Code di flow mod per switch: profondita', latenza, errori
+        return jsonify(mitigator.flow_mods.stats())
+
+    @app.route("/polling", methods=["GET"])
+    def get_polling_stats():
+        """Per-switch poll interval, pending requests and reply latency."""
+        return jsonify(mitigator.controller.monitor.polling_stats())
+
+    @app.route("/anomalies", methods=["GET"])
+    def get_anomaly_bus_stats():
+        """Queue depth and coalescing counters of the anomaly bus."""
+        return jsonify(mitigator.anomaly_bus.stats())
+
+    @app.route("/logging", methods=["GET"])
+    def get_logging_stats():
+        """Suppressed-message counters and async log queue state."""
+        return jsonify(logging_stats())
+
     @app.route("/policy", methods=["POST"])
     def add_policy():
         """Add an external blocking policy."""
@@ -68,7 +116,10 @@ def start_api_server(mitigator, host="0.0.0.0", port=5000):
         if not policy_id:
             return jsonify({"error": "policy_id is required"}), 400
 
-        mitigator.add_external_policy(policy_id, policy)
+        try:
+            mitigator.add_external_policy(policy_id, policy)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         logger.info(f"Policy aggiunta via API: {policy_id}")
         return jsonify(
             {"status": "policy_added", "policy_id": policy_id, "policy": policy}
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark for AdaptiveThresholdPlugin
+Compares the per-key list implementation with the vectorized one
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from detector import AdaptiveThresholdPlugin
+
+
+class ListAdaptiveThresholdPlugin:
+    """Previous implementation: a Python list and np.mean/np.std per key."""
+
+    def __init__(self, window=10, std_factor=3):
+        self.window = window
+        self.std_factor = std_factor
+        self.history = {}
+
+    def analyze(self, stats):
+        anomalies = []
+        for key, value in stats.items():
+            throughput = value.get("throughput", 0)
+            hist = self.history.setdefault(key, [])
+            # Baseline sui campioni precedenti, come il plugin vettoriale
+            if len(hist) >= self.window:
+                mean = np.mean(hist)
+                std = np.std(hist)
+                if throughput > mean + self.std_factor * std:
+                    anomalies.append(
+                        {"key": key, "throughput": throughput, "mean": mean, "std": std}
+                    )
+            hist.append(throughput)
+            if len(hist) > self.window:
+                hist.pop(0)
+        return anomalies
+
+
+def build_cycles(keys, cycles, seed=1):
+    """Noisy steady throughput per key, with 0.1% of keys bursting late."""
+    rng = np.random.default_rng(seed)
+    names = [
+        f"tcp_10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}_10.0.0.1" for i in range(keys)
+    ]
+    base = rng.uniform(1e3, 1e6, keys)
+    bursting = rng.choice(keys, max(keys // 1000, 1), replace=False)
+    batches = []
+    for cycle in range(cycles):
+        rates = base * rng.normal(1.0, 0.05, keys)
+        if cycle >= cycles - 2:
+            rates[bursting] *= 20
+        batches.append(
+            {name: {"throughput": float(r)} for name, r in zip(names, rates)}
+        )
+    return batches, {names[i] for i in bursting.tolist()}
+
+
+def run(plugin, batches):
+    found = set()
+    start = time.perf_counter()
+    for stats in batches:
+        found.update(a["key"] for a in plugin.analyze(stats))
+    return (time.perf_counter() - start) / len(batches), found
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    cycles = 12
+    print(
+        f"{'keys':>8} {'list ms/cycle':>14} {'vector ms/cycle':>16} {'speedup':>8} same"
+    )
+    for keys in sizes:
+        batches, bursting = build_cycles(keys, cycles)
+        old_time, old_found = run(ListAdaptiveThresholdPlugin(), batches)
+        new_time, new_found = run(AdaptiveThresholdPlugin(), batches)
+        # Il confronto ha senso solo se i burst iniettati vengono trovati
+        assert bursting <= old_found, "list plugin missed bursting keys"
+        assert bursting <= new_found, "vector plugin missed bursting keys"
+        print(
+            f"{keys:>8} {old_time * 1e3:>14.2f} {new_time * 1e3:>16.2f} "
+            f"{old_time / new_time:>7.1f}x {old_found == new_found}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Soak benchmark for the detector plugin state
+Churns flow keys for many simulated cycles and tracks plugin memory
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from detector import AdaptiveThresholdPlugin
+
+
+def churn(cycles, active, churn_rate, interval, seed=1):
+    """Yield (now, stats): `active` live keys, a fraction replaced per cycle."""
+    rng = np.random.default_rng(seed)
+    next_id = active
+    live = list(range(active))
+    replace = int(active * churn_rate)
+    now = time.time()
+    for _ in range(cycles):
+        for slot in rng.choice(active, replace, replace=False).tolist():
+            live[slot] = next_id
+            next_id += 1
+        rates = rng.uniform(1e3, 1e6, active)
+        yield now, {
+            f"udp_10.{k >> 16 & 255}.{k >> 8 & 255}.{k & 255}_10.0.0.1": {
+                "throughput": float(r)
+            }
+            for k, r in zip(live, rates)
+        }
+        now += interval
+
+
+def soak(plugin, cycles, active, churn_rate, interval, report_every):
+    tracemalloc.start()
+    elapsed = 0.0
+    rows = []
+    for cycle, (now, stats) in enumerate(
+        churn(cycles, active, churn_rate, interval), 1
+    ):
+        start = time.perf_counter()
+        plugin.analyze(stats, now=now)
+        elapsed += time.perf_counter() - start
+        if cycle % report_every == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            rows.append((cycle, len(plugin), plugin.capacity, current))
+    tracemalloc.stop()
+    return rows, elapsed
+
+
+def main():
+    args = [float(arg) for arg in sys.argv[1:]]
+    cycles = int(args[0]) if len(args) > 0 else 400
+    active = int(args[1]) if len(args) > 1 else 2000
+    churn_rate = args[2] if len(args) > 2 else 0.1
+    interval = 5
+    report_every = max(cycles // 8, 1)
+    print(
+        f"{cycles} cycles x {interval}s, {active} active keys, "
+        f"{churn_rate:.0%} replaced per cycle"
+    )
+
+    for label, plugin in (
+        ("unbounded", AdaptiveThresholdPlugin(ttl=None, max_keys=None)),
+        ("ttl=120s", AdaptiveThresholdPlugin(ttl=120, max_keys=100000)),
+        ("ttl=120s max=2500", AdaptiveThresholdPlugin(ttl=120, max_keys=2500)),
+    ):
+        rows, elapsed = soak(plugin, cycles, active, churn_rate, interval, report_every)
+        print(f"\n{label}: {elapsed / cycles * 1e3:.2f} ms/analyze (tracemalloc on)")
+        print(f"{'cycle':>7} {'keys':>8} {'capacity':>9} {'traced MiB':>11}")
+        for cycle, keys, capacity, current in rows:
+            print(f"{cycle:>7} {keys:>8} {capacity:>9} {current / 2**20:>11.2f}")
+        print(
+            f"evicted: ttl={plugin.evicted_ttl} lru={plugin.evicted_lru}, "
+            f"state {plugin.memory_bytes() / 2**20:.2f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the sketch-based heavy-hitter tracker
+Shows the accuracy-vs-memory trade-off under a spoofed-MAC flood
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+from sketches import HeavyHitterTracker
+
+
+def random_mac(rng):
+    return ":".join(f"{rng.randrange(256):02x}" for _ in range(6))
+
+
+def build_trace(spoofed, heavy, heavy_packets, seed=1):
+    """Spoofed sources send one packet each; heavy sources send many."""
+    rng = random.Random(seed)
+    heavy_macs = [f"00:00:00:00:01:{i:02x}" for i in range(heavy)]
+    trace = [random_mac(rng) for _ in range(spoofed)]
+    for rank, mac in enumerate(heavy_macs):
+        trace.extend([mac] * (heavy_packets // (rank + 1)))
+    rng.shuffle(trace)
+    return trace, heavy_macs
+
+
+def run(trace, heavy_macs, width, depth, capacity):
+    tracker = HeavyHitterTracker(
+        width=width, depth=depth, capacity=capacity, epoch=3600
+    )
+    now = time.time()
+    start = time.perf_counter()
+    promoted = set()
+    for mac in trace:
+        if tracker.update(mac, now):
+            promoted.add(mac)
+    elapsed = time.perf_counter() - start
+
+    exact = Counter(trace)
+    top = [mac for mac, _ in tracker.top(len(heavy_macs), now)]
+    recall = len(set(top) & set(heavy_macs)) / len(heavy_macs)
+    errors = [
+        (tracker.sketch.estimate(mac) - exact[mac]) / exact[mac] for mac in heavy_macs
+    ]
+    false_promotions = len(promoted - set(heavy_macs))
+    return {
+        "memory": tracker.memory_bytes(),
+        "recall": recall,
+        "error": sum(errors) / len(errors),
+        "false": false_promotions,
+        "rate": len(trace) / elapsed,
+    }
+
+
+def exact_memory(trace):
+    tracemalloc.start()
+    counts = Counter(trace)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del counts
+    return size
+
+
+def main():
+    spoofed = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    trace, heavy_macs = build_trace(spoofed, heavy=10, heavy_packets=2000)
+
+    print("HeavyHitterTracker accuracy vs memory")
+    print("=" * 72)
+    print(f"packets: {len(trace)}, distinct sources: {len(set(trace))}")
+    print(f"exact per-source dict: {exact_memory(trace) / 1024:,.0f} KiB")
+    print(
+        f"{'width':>7}{'depth':>6}{'KiB':>8}{'top-10 recall':>15}"
+        f"{'mean overcount':>16}{'false promo':>12}{'pkts/s':>10}"
+    )
+    for width in (256, 1024, 4096, 16384):
+        for depth in (2, 4):
+            r = run(trace, heavy_macs, width, depth, capacity=64)
+            print(
+                f"{width:>7}{depth:>6}{r['memory'] / 1024:>8.0f}{r['recall']:>15.2f}"
+                f"{r['error']:>16.3f}{r['false']:>12}{r['rate']:>10,.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
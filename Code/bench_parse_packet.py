@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for Monitor.parse_packet
+Compares the struct fast path with the full Ryu decoder (packets/s)
+"""
+
+import sys
+import time
+
+from ryu.lib.packet import packet, ethernet, vlan, ipv4, icmp, udp, tcp, ipv6
+
+from monitor import Monitor
+
+
+def build_frames():
+    """Build a representative mix of frames seen by the packet-in handler."""
+    frames = {}
+
+    def serialize(*protocols):
+        pkt = packet.Packet()
+        for proto in protocols:
+            pkt.add_protocol(proto)
+        pkt.serialize()
+        return bytes(pkt.data)
+
+    eth_ip = ethernet.ethernet(
+        dst="00:00:00:00:00:03", src="00:00:00:00:00:01", ethertype=0x0800
+    )
+    frames["udp"] = serialize(
+        eth_ip,
+        ipv4.ipv4(src="10.0.0.1", dst="10.0.0.3", proto=17),
+        udp.udp(src_port=40000, dst_port=12345),
+        b"x" * 64,
+    )
+    frames["tcp_syn"] = serialize(
+        eth_ip,
+        ipv4.ipv4(src="10.0.0.1", dst="10.0.0.3", proto=6),
+        tcp.tcp(src_port=40001, dst_port=80, bits=tcp.TCP_SYN),
+    )
+    frames["icmp"] = serialize(
+        eth_ip,
+        ipv4.ipv4(src="10.0.0.1", dst="10.0.0.3", proto=1),
+        icmp.icmp(type_=8, code=0, data=icmp.echo(id_=1, seq=1, data=b"ping")),
+    )
+    frames["vlan_udp"] = serialize(
+        ethernet.ethernet(
+            dst="00:00:00:00:00:03", src="00:00:00:00:00:02", ethertype=0x8100
+        ),
+        vlan.vlan(vid=10, pcp=3, ethertype=0x0800),
+        ipv4.ipv4(src="10.0.0.2", dst="10.0.0.3", proto=17),
+        udp.udp(src_port=5000, dst_port=53),
+    )
+    frames["ipv6_udp"] = serialize(
+        ethernet.ethernet(
+            dst="33:33:00:00:00:fb", src="00:00:00:00:00:02", ethertype=0x86DD
+        ),
+        ipv6.ipv6(src="fe80::2", dst="ff02::fb", nxt=17),
+        udp.udp(src_port=5353, dst_port=5353),
+    )
+    return frames
+
+
+def bench(func, frames, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for data in frames:
+            func(data)
+    elapsed = time.perf_counter() - start
+    return iterations * len(frames) / elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    monitor = Monitor(controller=None)
+    frames = build_frames()
+
+    # Il fast path deve restituire lo stesso dizionario del decoder Ryu
+    for name, data in frames.items():
+        fast = monitor.parse_packet(data)
+        full = monitor._parse_packet_ryu(data)
+        assert fast == full, f"{name}: {fast} != {full}"
+
+    print("Monitor.parse_packet micro-benchmark")
+    print("=" * 50)
+    print(f"{'frame':<12}{'ryu pkts/s':>16}{'fast pkts/s':>16}{'speedup':>8}")
+    for name, data in frames.items():
+        before = bench(monitor._parse_packet_ryu, [data], iterations)
+        after = bench(monitor.parse_packet, [data], iterations)
+        print(f"{name:<12}{before:>16,.0f}{after:>16,.0f}{after / before:>7.1f}x")
+
+    mix = list(frames.values())
+    before = bench(monitor._parse_packet_ryu, mix, iterations // len(mix))
+    after = bench(monitor.parse_packet, mix, iterations // len(mix))
+    print(f"{'mix':<12}{before:>16,.0f}{after:>16,.0f}{after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
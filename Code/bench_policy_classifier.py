@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the external-policy classifier
+Lookup cost of PolicyClassifier vs the old linear scan, 10 to 100k policies
+"""
+
+import random
+import sys
+import time
+
+from policy_classifier import PolicyClassifier, compile_policy, constraints_match
+
+
+def build_policies(count, rng):
+    """Threat-feed style mix: mostly exact IPs, some CIDRs, ports and MAC prefixes."""
+    policies = {}
+    for i in range(count):
+        kind = i % 10
+        if kind < 7:
+            ip = (
+                f"172.{rng.randrange(16, 32)}.{rng.randrange(256)}.{rng.randrange(256)}"
+            )
+            policies[f"malicious_ip_{ip}"] = {"ipv4_src": ip, "severity": "high"}
+        elif kind < 9:
+            net = f"100.{rng.randrange(256)}.{rng.randrange(256)}.0/24"
+            policies[f"net_{i}"] = {"ipv4_src": net, "tcp_dst": 22}
+        else:
+            prefix = ":".join(f"{rng.randrange(256):02x}" for _ in range(3)) + ":"
+            policies[f"mac_{i}"] = {"eth_src_pattern": prefix}
+    return policies
+
+
+def build_packets(count, rng):
+    packets = []
+    for _ in range(count):
+        packets.append(
+            {
+                "eth": {
+                    "src": ":".join(f"{rng.randrange(256):02x}" for _ in range(6)),
+                    "dst": "00:00:00:00:00:07",
+                    "ethertype": 0x0800,
+                },
+                "ip": {
+                    "src": f"10.0.0.{rng.randrange(1, 255)}",
+                    "dst": "10.0.0.7",
+                    "proto": 6,
+                },
+                "udp": None,
+                "tcp": {
+                    "src_port": rng.randrange(1024, 65535),
+                    "dst_port": 80,
+                    "flags": 2,
+                },
+            }
+        )
+    return packets
+
+
+def linear_lookup(compiled, pkt):
+    # Equivalente della vecchia scansione di tutte le external_policies
+    for policy_id, constraints in compiled.items():
+        if constraints_match(constraints, pkt):
+            return policy_id
+    return None
+
+
+def per_lookup_us(func, packets):
+    start = time.perf_counter()
+    for pkt in packets:
+        func(pkt)
+    return (time.perf_counter() - start) / len(packets) * 1e6
+
+
+def main():
+    max_policies = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(1)
+    packets = build_packets(2000, rng)
+
+    print("External policy lookup (us per packet, no match)")
+    print("=" * 50)
+    print(f"{'policies':>10}{'linear':>12}{'classifier':>12}{'build ms':>12}")
+    count = 10
+    while count <= max_policies:
+        policies = build_policies(count, rng)
+        start = time.perf_counter()
+        classifier = PolicyClassifier()
+        for policy_id, policy in policies.items():
+            classifier.add(policy_id, policy)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        compiled = {pid: compile_policy(p) for pid, p in policies.items()}
+        sample = packets if count <= 1000 else packets[: max(20, 20000 // count)]
+        linear = per_lookup_us(lambda p: linear_lookup(compiled, p), sample)
+        indexed = per_lookup_us(classifier.match, packets)
+        print(f"{count:>10}{linear:>12.1f}{indexed:>12.1f}{build_ms:>12.1f}")
+        count *= 10
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark for Mitigator.should_block latency under concurrent writers
+Packet-in lookups run while API-like threads add blocks, shared entries
+and policies; reports p50/p99/p99.9/max latency of should_block
+"""
+
+import logging
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from host_tracker import HostTracker
+from mitigator import Mitigator
+
+
+class FakeDatapath:
+    """Minimal datapath: builds real OpenFlow messages and drops them."""
+
+    def __init__(self):
+        from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+        self.id = 1
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send(self, buf):
+        pass
+
+    def send_msg(self, msg):
+        pass
+
+
+class FakeController:
+    def __init__(self, datapath):
+        self.dps = {datapath.id: datapath}
+        self.mac_to_port = {}
+        self.hosts = HostTracker()
+
+
+def make_packet(rng):
+    host = rng.randrange(1, 250)
+    return {
+        "eth": {
+            "src": f"00:00:00:00:00:{host:02x}",
+            "dst": "00:00:00:00:00:fe",
+            "ethertype": 0x0800,
+        },
+        "ip": {"src": f"10.0.0.{host}", "dst": "10.0.0.254", "proto": 17},
+        "udp": {"src_port": rng.randrange(1024, 65535), "dst_port": 53},
+        "tcp": None,
+    }
+
+
+def writer(mitigator, datapath, stop, seed, rate):
+    rng = random.Random(seed)
+    i = 0
+    while not stop.wait(1.0 / rate):
+        i += 1
+        pkt = make_packet(rng)
+        flow_id = mitigator._flow_id(pkt)
+        choice = i % 4
+        if choice == 0:
+            mitigator.apply_block(datapath, flow_id)
+        elif choice == 1:
+            mitigator.add_to_shared_blocklist(flow_id, duration=60, source="bench")
+        elif choice == 2:
+            mitigator.add_external_policy(
+                f"bench_{seed}_{i % 500}", {"ipv4_src": f"172.16.{i % 256}.{seed}"}
+            )
+        else:
+            # Come GET /policies e GET /blocked dell'API
+            mitigator.get_all_policies()
+            {str(k): v for k, v in mitigator.get_blocked_flows().items()}
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def run(writers, lookups, preload, rate):
+    datapath = FakeDatapath()
+    mitigator = Mitigator(FakeController(datapath))
+    rng = random.Random(0)
+    for i in range(preload):
+        mitigator.add_external_policy(
+            f"feed_{i}", {"ipv4_src": f"172.20.{i // 256 % 256}.{i % 256}"}
+        )
+        mitigator.add_to_shared_blocklist(mitigator._flow_id(make_packet(rng)), 600)
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=writer, args=(mitigator, datapath, stop, seed, rate))
+        for seed in range(writers)
+    ]
+    for t in threads:
+        t.start()
+
+    latencies = []
+    for _ in range(lookups):
+        pkt = make_packet(rng)
+        start = time.perf_counter()
+        mitigator.should_block(pkt, datapath, 1)
+        latencies.append(time.perf_counter() - start)
+
+    stop.set()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    return [percentile(latencies, p) * 1e6 for p in (50, 99, 99.9)] + [
+        latencies[-1] * 1e6
+    ]
+
+
+def main():
+    # Log a INFO su file come sotto ryu-manager: l'I/O avviene negli scrittori
+    log_file = tempfile.NamedTemporaryFile(suffix=".log")
+    logging.basicConfig(filename=log_file.name, level=logging.INFO)
+
+    lookups = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    preload = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 200
+    print(f"should_block latency, writers at {rate:.0f} writes/s each (us)")
+    print("=" * 50)
+    print(f"{'writers':>8}{'p50':>12}{'p99':>12}{'p99.9':>12}{'max':>12}")
+    for writers in (0, 1, 4):
+        p50, p99, p999, worst = run(writers, lookups, preload, rate)
+        print(f"{writers:>8}{p50:>12.1f}{p99:>12.1f}{p999:>12.1f}{worst:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
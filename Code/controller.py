@@ -15,6 +15,7 @@
 
 import threading
 import logging
+import time
 from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
@@ -24,6 +25,11 @@ from ryu.ofproto import ofproto_v1_3
 from monitor import Monitor
 from detector import Detector
 from mitigator import Mitigator
+from host_tracker import HostTracker
+from profiles import HandshakeTracker, HostProfileTable
+from sketches import HeavyHitterTracker
+from logging_utils import RateLimitedLogger, enable_async_logging
+from logging_utils import disable_async_logging
 
 try:
     from api import start_api_server
@@ -42,12 +48,56 @@ class ModularController(app_manager.RyuApp):
     def __init__(self, *args, **kwargs):
         super(ModularController, self).__init__(*args, **kwargs)
         self.logger.setLevel(logging.INFO)
+        # Log dei percorsi caldi (packet-in, stats reply): limitati per
+        # call site e formattati solo se emessi
+        self.hot_log = RateLimitedLogger(self.logger, rate=1.0, burst=5)
+        # Sposta l'I/O dei log su un thread dedicato con coda limitata
+        self.async_logging = True
+        if self.async_logging:
+            enable_async_logging(max_queue=10000)
         self.mac_to_port = {}
+        # Switch e porta di accesso di ogni host, per i drop all'ingresso
+        self.hosts = HostTracker(max_hosts=65536)
         self.dps = {}  # <-- AGGIUNGI per tenere traccia degli switch
         self.monitor = Monitor(self)
         self.detector = Detector(self, interval=5)  # <-- AGGIUNGI interval
         self.mitigator = Mitigator(self)
         self.running = True
+        self._traffic_profiles = HostProfileTable(ttl=30, window=20, max_profiles=4096)
+        # Sketch a memoria fissa: solo i sorgenti "heavy hitter" ottengono
+        # un profilo completo (None per profilare ogni sorgente)
+        self.heavy_hitters = HeavyHitterTracker(
+            width=8192, depth=4, capacity=64, promote_count=10, epoch=10
+        )
+        # SYN/SYN-ACK/ACK per server: rileva SYN flood con sorgenti spoofate,
+        # che non superano mai le soglie dei profili per sorgente
+        self.handshakes = HandshakeTracker(
+            window=10, min_syns=50, ratio=3.0, max_destinations=1024
+        )
+        # Soglie sui tentativi di connessione distinti per sorgente
+        # (stime HyperLogLog nella finestra del profilo)
+        self.sweep_hosts = 64
+        self.scan_ports = 100
+
+        # Proactive forwarding: once both ends are learned, install an
+        # entry for the flow (MACs, IPs, protocol, ports) so its later
+        # packets stay on the switch; new flows still reach the checks. The hard
+        # timeout sends the flow back through should_block periodically,
+        # so blocks and policies added meanwhile still apply.
+        self.proactive_forwarding = True
+        self.flow_idle_timeout = 10
+        self.flow_hard_timeout = 60
+        # Event-driven accounting: forwarding entries report their final
+        # counters via FlowRemoved, so the full flow table is only dumped
+        # once per hard timeout (long-lived flows) or while a switch is
+        # under attack.
+        self.flow_accounting = True
+        if self.flow_accounting:
+            self.monitor.enable_flow_accounting(
+                flow_poll_interval=self.flow_hard_timeout,
+                # Rate finali dei flussi rimossi visibili per un ciclo del detector
+                removed_hold=self.detector.interval,
+            )
 
         # Start threads
         self.monitor_thread = threading.Thread(target=self.monitor.run, daemon=True)
@@ -63,6 +113,16 @@ class ModularController(app_manager.RyuApp):
         )  # <-- AGGIUNGI
         self.mitigator_thread.start()
 
+        self.anomaly_thread = threading.Thread(
+            target=self.mitigator.consume_anomalies, daemon=True
+        )
+        self.anomaly_thread.start()
+
+        self.flow_mod_thread = threading.Thread(
+            target=self.mitigator.flow_mods.run, daemon=True
+        )
+        self.flow_mod_thread.start()
+
         # Start API
         if start_api_server:
             self.api_thread = threading.Thread(
@@ -81,6 +141,8 @@ class ModularController(app_manager.RyuApp):
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
         self.dps[datapath.id] = datapath  # <-- AGGIUNGI per tracciare gli switch
+        # Switch nuovo o riconnesso: nessun drop installato
+        self.mitigator.switch_connected(datapath)
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         match = parser.OFPMatch()
@@ -104,6 +166,7 @@ class ModularController(app_manager.RyuApp):
         dpid = datapath.id
         self.mac_to_port.setdefault(dpid, {})
         self.mac_to_port[dpid][src] = in_port
+        self.hosts.learn(dpid, in_port, src, (pkt.get("ip") or {}).get("src"))
 
         # AGGIUNGI: Detection semplice basata su frequenza
         self._check_dos_patterns(pkt, datapath, in_port)
@@ -111,13 +174,33 @@ class ModularController(app_manager.RyuApp):
         # Check for mitigation actions
         block_action = self.mitigator.should_block(pkt, datapath, in_port)
         if block_action:
-            self.logger.info(f"Blocking flow: {block_action}")
-            self.mitigator.apply_block(datapath, block_action)
+            # Flusso gia' bloccato: reinstalla il drop solo se manca, senza
+            # contare il pacchetto come nuova rilevazione
+            if self.mitigator.ensure_block(datapath, block_action):
+                self.hot_log.info("Blocking flow: %s", block_action)
             return
 
         # Normal forwarding
         out_port = self.mac_to_port[dpid].get(dst, datapath.ofproto.OFPP_FLOOD)
         actions = [datapath.ofproto_parser.OFPActionOutput(out_port)]
+        # Un SYN isolato non installa la entry: l'ACK che completa
+        # l'handshake deve arrivare al controller per HandshakeTracker
+        tcp = pkt.get("tcp")
+        bare_syn = bool(tcp) and tcp.get("flags") == 0x02
+        if (
+            self.proactive_forwarding
+            and out_port != datapath.ofproto.OFPP_FLOOD
+            and not bare_syn
+        ):
+            self.mitigator.install_forwarding_flow(
+                datapath,
+                in_port,
+                pkt,
+                actions,
+                idle_timeout=self.flow_idle_timeout,
+                hard_timeout=self.flow_hard_timeout,
+                send_flow_removed=self.flow_accounting,
+            )
         self.mitigator.forward_packet(msg, datapath, in_port, actions, src, dst)
 
     def _check_dos_patterns(self, pkt, datapath, in_port):
@@ -143,82 +226,60 @@ class ModularController(app_manager.RyuApp):
         if eth.get("ethertype") == 0x88CC:
             return
 
-        import time
-
         now = time.time()
 
-        if not hasattr(self, "_traffic_profiles"):
-            self._traffic_profiles = {}
-            self._last_cleanup = now
-
-        # Pulizia periodica (ogni 60 secondi)
-        if now - self._last_cleanup > 60:
-            old_hosts = [
-                h
-                for h, data in self._traffic_profiles.items()
-                if now - data["last_update"] > 30
-            ]
-            for h in old_hosts:
-                del self._traffic_profiles[h]
-            self._last_cleanup = now
+        # Handshake TCP per server, prima del filtro heavy hitter: in un
+        # SYN flood spoofato ogni sorgente invia pochi pacchetti
+        if tcp and ip:
+            self._check_syn_flood(ip["src"], ip["dst"], tcp.get("flags"), datapath, now)
 
-        # Inizializza/aggiorna profilo del traffico
-        if src not in self._traffic_profiles:
-            self._traffic_profiles[src] = {
-                "first_seen": now,
-                "last_update": now,
-                "packet_history": [],
-                "tcp_syn_count": 0,
-                "ping_count": 0,
-                "udp_count": 0,
-                "rate_history": [],
-                "targets": set(),
-                "block_count": 0,
-                "is_likely_legitimate": False,
-            }
-
-        profile = self._traffic_profiles[src]
-        profile["last_update"] = now
-        profile["packet_history"].append(now)
-        profile["targets"].add(dst)
-
-        # Limita la storia a ultimi 20 secondi
-        profile["packet_history"] = [
-            t for t in profile["packet_history"] if now - t < 20
-        ]
+        # Pulizia dei profili inattivi: la tabella e' ordinata per ultimo
+        # aggiornamento, quindi si visitano solo i profili scaduti
+        self._traffic_profiles.expire(now)
+
+        # Con MAC sorgenti randomizzati ogni sorgente resta nello sketch;
+        # il profilo completo si crea solo per gli heavy hitter
+        if self.heavy_hitters is not None:
+            is_heavy = self.heavy_hitters.update(src, now)
+            if not is_heavy and src not in self._traffic_profiles:
+                return
 
         # Classifica tipo di pacchetto
-        if tcp:
-            if hasattr(tcp, "bits") and tcp.bits == 2:  # SYN
-                profile["tcp_syn_count"] += 1
-        elif ip and ip.get("proto") == 1:  # ICMP
-            profile["ping_count"] += 1
-        elif udp:
-            profile["udp_count"] += 1
-
-        # Calcola rate attuale (pacchetti/secondo)
-        time_window = min(20, now - profile["first_seen"])
-        if time_window > 0:
-            current_rate = len(profile["packet_history"]) / time_window
-            profile["rate_history"].append(current_rate)
-            # Mantieni solo ultime 5 misurazioni
-            if len(profile["rate_history"]) > 5:
-                profile["rate_history"].pop(0)
+        is_syn = bool(tcp) and tcp.get("flags") == 0x02  # SYN
+        is_icmp = not tcp and bool(ip) and ip.get("proto") == 1  # ICMP
+        is_udp = not tcp and not is_icmp and bool(udp)
+
+        # Inizializza/aggiorna profilo del traffico
+        profile = self._traffic_profiles.touch(src, now)
+        profile.record(now, syn=is_syn, icmp=is_icmp, udp=is_udp)
+        # Tentativi di connessione: host e porte distinti (sweep e scan)
+        if is_syn:
+            profile.record_probe(now, ip.get("dst"), tcp.get("dst_port"))
+        elif is_icmp and (pkt.get("icmp") or {}).get("type") == 8:  # echo request
+            profile.record_probe(now, ip.get("dst"))
+
+        # Calcola rate attuale (pacchetti/secondo) sugli ultimi 20 secondi
+        current_rate = profile.rate(now)
+        profile.rate_history.append(current_rate)
 
         # Se il profilo esiste da almeno 10 secondi, valuta il suo comportamento
-        host_age = now - profile["first_seen"]
+        host_age = now - profile.first_seen
         if host_age < 10:
             return  # Aspetta per avere dati sufficienti
 
         # DETECTION basata su profili comportamentali
         is_dos = False
         reason = ""
+        rate_history = profile.rate_history
+        flow_id = self.mitigator._flow_id(pkt)
+        probed_hosts = profile.probed_hosts.estimate()
+        probed_ports = profile.probed_ports.estimate()
 
         # 1. Alta percentuale di SYN (tipico di SYN flood)
-        total_pkts = len(profile["packet_history"])
-        if total_pkts > 20 and profile["tcp_syn_count"] > total_pkts * 0.8:
+        total_pkts = profile.packet_count
+        if total_pkts > 20 and profile.syn_count > total_pkts * 0.8:
             is_dos = True
-            reason = f"SYN flood: {profile['tcp_syn_count']}/{total_pkts} SYN packets"
+            reason = f"SYN flood: {profile.syn_count}/{total_pkts} SYN packets"
 
         # 2. Burst estremi (>100 pkt/s)
         elif current_rate > 100:
@@ -227,51 +288,134 @@ class ModularController(app_manager.RyuApp):
 
         # 3. Aumento rapido del rate (>4x in pochi secondi)
         elif (
-            len(profile["rate_history"]) > 2
-            and profile["rate_history"][-1] > 4 * profile["rate_history"][0]
-            and profile["rate_history"][-1] > 50
+            len(rate_history) > 2
+            and rate_history[-1] > 4 * rate_history[0]
+            and rate_history[-1] > 50
         ):
             is_dos = True
-            reason = f"Rate spike: {profile['rate_history'][0]:.1f} to {profile['rate_history'][-1]:.1f} pkts/s"
+            reason = (
+                f"Rate spike: {rate_history[0]:.1f} to {rate_history[-1]:.1f} pkts/s"
+            )
 
         # 4. Rate sostenuto alto (>60 pkt/s per >15s)
-        elif (
-            current_rate > 60 and host_age > 15 and len(profile["packet_history"]) > 200
-        ):
+        elif current_rate > 60 and host_age > 15 and total_pkts > 200:
             is_dos = True
             reason = (
                 f"Sustained high rate: {current_rate:.1f} pkts/s for {host_age:.1f}s"
             )
 
+        # 5. Sweep orizzontale: molti host distinti sondati. Lo scanner
+        # cambia destinazione a ogni pacchetto: si blocca la sorgente
+        elif probed_hosts > self.sweep_hosts:
+            is_dos = True
+            reason = f"Host sweep: ~{probed_hosts:.0f} hosts probed"
+            flow_id = (src, None, (ip or {}).get("src"), None, None, None)
+
+        # 6. Port scan verticale: molte porte distinte
+        elif probed_ports > self.scan_ports:
+            is_dos = True
+            reason = f"Port scan: ~{probed_ports:.0f} ports probed"
+            flow_id = (src, None, (ip or {}).get("src"), None, None, None)
+
         # Log periodico per debug
         if total_pkts % 30 == 0:
-            self.logger.info(
-                f"Profile {src}: {current_rate:.1f} pkts/s, {len(profile['targets'])} targets, "
-                f"{profile['tcp_syn_count']} SYNs, {profile['ping_count']} pings, age={host_age:.1f}s"
+            self.hot_log.info(
+                "Profile %s: %.1f pkts/s, ~%d hosts, ~%d ports, %d SYNs, %d pings, "
+                "age=%.1fs",
+                src,
+                current_rate,
+                probed_hosts,
+                probed_ports,
+                profile.syn_count,
+                profile.ping_count,
+                host_age,
             )
 
         if is_dos:
-            profile["block_count"] += 1
-            self.logger.info(f"*** DoS DETECTED from {src}: {reason} ***")
-            flow_id = self.mitigator._flow_id(pkt)
+            profile.block_count += 1
+            self.hot_log.info("*** DoS DETECTED from %s: %s ***", src, reason)
             self.mitigator.apply_block(datapath, flow_id)
+            self.monitor.report_activity(datapath.id)
             # Reset contatori
-            profile["packet_history"] = []
-            profile["tcp_syn_count"] = 0
+            profile.reset_window()
+
+    def _check_syn_flood(self, src, dst, flags, datapath, now):
+        self.handshakes.expire(now)
+        flood = self.handshakes.record(src, dst, flags, now)
+        if flood is None:
+            return
+        server, syn, syn_ack, ack = flood
+        self.hot_log.info(
+            "*** SYN flood against %s: %d SYN, %d SYN-ACK, %d ACK in %ds ***",
+            server,
+            syn,
+            syn_ack,
+            ack,
+            self.handshakes.window,
+        )
+        self.monitor.report_activity(datapath.id)
+        # Sorgenti spoofate: nessun flusso da bloccare, solo segnalazione
+        self.mitigator.anomaly_bus.publish(
+            [
+                {
+                    "key": f"syn_flood_{server}",
+                    "type": "syn_flood",
+                    "dpid": datapath.id,
+                    "syn": syn,
+                    "syn_ack": syn_ack,
+                    "ack": ack,
+                }
+            ],
+            timeout=0,
+        )
 
     @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
     def flow_stats_reply_handler(self, ev):
-        self.logger.info(f"Received flow stats from switch {ev.msg.datapath.id}")
-        self.monitor.update_flow_stats(ev.msg.datapath.id, ev.msg.body)
+        msg = ev.msg
+        self.hot_log.info("Received flow stats from switch %s", msg.datapath.id)
+        more = msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE
+        self.monitor.add_stats_reply("flows", msg.datapath.id, msg.xid, msg.body, more)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        self.monitor.flow_removed(ev.msg.datapath.id, ev.msg)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        self.mitigator.flow_mods.barrier_reply(ev.msg.datapath.id, ev.msg.xid)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def error_msg_handler(self, ev):
+        msg = ev.msg
+        if self.mitigator.flow_mods.error(msg.datapath.id, msg):
+            self.hot_log.warning(
+                "Flow mod rejected by switch %s: type=%s code=%s xid=%s",
+                msg.datapath.id,
+                msg.type,
+                msg.code,
+                msg.xid,
+            )
+        else:
+            self.hot_log.warning(
+                "Error from switch %s: type=%s code=%s",
+                msg.datapath.id,
+                msg.type,
+                msg.code,
+            )
 
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
     def port_stats_reply_handler(self, ev):
-        self.logger.info(f"Received port stats from switch {ev.msg.datapath.id}")
-        self.monitor.update_port_stats(ev.msg.datapath.id, ev.msg.body)
+        msg = ev.msg
+        self.hot_log.info("Received port stats from switch %s", msg.datapath.id)
+        more = msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE
+        self.monitor.add_stats_reply("ports", msg.datapath.id, msg.xid, msg.body, more)
 
     def stop(self):
         self.running = False
         self.monitor.stop()
+        self.detector.stop()
+        self.mitigator.stop()
+        disable_async_logging()
         if start_api_server:
             # Implement graceful API shutdown if needed
             pass
@@ -1,7 +1,13 @@
 import threading
 import logging
+import socket
+import struct
+from collections import deque
 import numpy as np
 import time  # <-- AGGIUNGI QUESTO IMPORT
+from logging_utils import RateLimitedLogger
+from plugin_pool import PluginWorker, SharedStatsBuffer, rows_from_columns
+from stats_store import KIND_MAC, KIND_PROTOCOL
 
 
 class DetectionPlugin:
@@ -12,29 +18,508 @@ class DetectionPlugin:
         return []
 
 
-class AdaptiveThresholdPlugin(DetectionPlugin):
-    """Rilevamento basato su soglie adattive (media mobile, dev. std)."""
+class ArrayDetectionPlugin(DetectionPlugin):
+    """Plugin that can also run in a worker process on columnar rows.
 
-    def __init__(self, window=10, std_factor=3):
+    analyze_rows() receives a NumPy array of plugin_pool.STATS_DTYPE rows
+    (key_id, kind, dpid, throughput, packet_rate) read in place from shared
+    memory, and returns anomaly dicts carrying the row "index" instead of
+    the key; the detector maps it back to key, dpid and kind. Anomalies
+    not tied to one row (e.g. a victim host) carry their own "key".
+    """
+
+    def analyze_rows(self, rows, now):
+        return []
+
+
+def iter_stat_tables(stats):
+    """Yield (kind, dpid, table) for every per-switch table of a snapshot.
+
+    Accepts the Monitor snapshot ({"macs"/"protocols": {dpid: {key:
+    entry}}}) or a flat {key: entry} mapping, returned as a single table
+    with kind and dpid None.
+    """
+    if "macs" in stats and "protocols" in stats:
+        for kind in ("macs", "protocols"):
+            for dpid, table in stats[kind].items():
+                yield kind, dpid, table
+    else:
+        yield None, None, stats
+
+
+_IPV4_INT = struct.Struct("!I")
+
+
+def _address_code(address):
+    # MAC "aa:bb:..." o IPv4 "a.b.c.d" -> intero; 0 se assente o non valido
+    try:
+        if ":" in address:
+            return int(address.replace(":", ""), 16)
+        return _IPV4_INT.unpack(socket.inet_aton(address))[0]
+    except (OSError, ValueError):
+        return 0
+
+
+def key_addresses(key):
+    """(src, dst) address codes of a stats key ("src_dst", "tcp_src_dst")."""
+    parts = key.split("_") if isinstance(key, str) else ()
+    if len(parts) == 3 and parts[0] in ("tcp", "udp"):
+        parts = parts[1:]
+    if len(parts) != 2:
+        return 0, 0  # es. ip_proto_N
+    return _address_code(parts[0]), _address_code(parts[1])
+
+
+def format_address(kind, code):
+    if kind == KIND_MAC or code > 0xFFFFFFFF:
+        return ":".join(f"{(code >> shift) & 0xFF:02x}" for shift in range(40, -1, -8))
+    return socket.inet_ntoa(_IPV4_INT.pack(code))
+
+
+class StatsRowBuilder:
+    """Flatten stats snapshots into STATS_DTYPE columns with stable key ids.
+
+    Ids are never reused; keys absent for `ttl` seconds are forgotten.
+    """
+
+    _KIND_CODES = {"macs": KIND_MAC, "protocols": KIND_PROTOCOL, None: -1}
+
+    def __init__(self, ttl=120):
+        self.ttl = ttl
+        self._ids = {}  # (kind, dpid, key) -> [key_id, last_seen, src, dst]
+        self._next_id = 0
+
+    def build(self, stats, now):
+        """Return (columns, keys) where keys[i] is row i's (kind, dpid, key)."""
+        ids = self._ids
+        key_ids = []
+        kinds = []
+        dpids = []
+        throughput = []
+        packet_rate = []
+        src = []
+        dst = []
+        keys = []
+        for kind, dpid, table in iter_stat_tables(stats):
+            code = self._KIND_CODES[kind]
+            for key, entry in table.items():
+                full_key = (kind, dpid, key)
+                slot = ids.get(full_key)
+                if slot is None:
+                    slot = ids[full_key] = [self._next_id, now, *key_addresses(key)]
+                    self._next_id += 1
+                else:
+                    slot[1] = now
+                key_ids.append(slot[0])
+                src.append(slot[2])
+                dst.append(slot[3])
+                throughput.append(entry.get("throughput", 0))
+                packet_rate.append(entry.get("packet_rate", 0))
+                keys.append(full_key)
+            kinds.extend([code] * len(table))
+            dpids.extend([dpid or 0] * len(table))
+        stale = [key for key, slot in ids.items() if now - slot[1] > self.ttl]
+        for key in stale:
+            del ids[key]
+        columns = {
+            "key_id": np.array(key_ids, dtype=np.int64),
+            "kind": np.array(kinds, dtype=np.int8),
+            "dpid": np.array(dpids, dtype=np.uint64),
+            "throughput": np.array(throughput, dtype=np.float64),
+            "packet_rate": np.array(packet_rate, dtype=np.float64),
+            "src": np.array(src, dtype=np.uint64),
+            "dst": np.array(dst, dtype=np.uint64),
+        }
+        return columns, keys
+
+
+class KeyedWindows:
+    """Per-key sliding windows of samples in one NumPy ring array.
+
+    Each key owns a row of `series` x `window` samples, so pushing a batch
+    of samples and computing window moments for every key are single
+    vectorized operations. Keys not seen for `ttl` seconds are evicted,
+    and at the end of a cycle the least recently seen keys beyond
+    `max_keys` are evicted as well, so memory follows the active keys
+    rather than every key ever seen. Freed rows are reused and the arrays
+    shrink once mostly empty.
+    """
+
+    def __init__(self, window=10, series=1, capacity=1024, ttl=120, max_keys=100000):
+        self.window = window
+        self.series = series
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+        self._min_capacity = capacity
+        self._rows = {}  # chiave -> riga
+        self._keys = [None] * capacity  # riga -> chiave
+        self._free = []
+        self._next = 0
+        self._samples = np.zeros((capacity, series, window))
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        # Righe libere a +inf: mai scadute, mai scelte dall'LRU
+        self._last_seen = np.full(capacity, np.inf)
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def capacity(self):
+        return len(self._counts)
+
+    def _resize(self, capacity, rows):
+        """Move `rows` (in order) to the front of arrays of `capacity` rows."""
+        samples = np.zeros((capacity, self.series, self.window))
+        counts = np.zeros(capacity, dtype=np.int64)
+        last_seen = np.full(capacity, np.inf)
+        samples[: len(rows)] = self._samples[rows]
+        counts[: len(rows)] = self._counts[rows]
+        last_seen[: len(rows)] = self._last_seen[rows]
+        self._samples, self._counts, self._last_seen = samples, counts, last_seen
+
+    def _add_key(self, key):
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = self._next
+            if row == self.capacity:
+                self._resize(2 * row, np.arange(row))
+                self._keys.extend([None] * row)
+            self._next += 1
+        self._rows[key] = row
+        self._keys[row] = key
+        self._counts[row] = 0
+        return row
+
+    def rows_for(self, keys):
+        """Row ids of `keys` as an index array, adding the new ones."""
+        rows = self._rows
+        ids = [rows.get(key) for key in keys]
+        if None in ids:
+            ids = [
+                self._add_key(key) if row is None else row
+                for key, row in zip(keys, ids)
+            ]
+        return np.array(ids, dtype=np.intp)
+
+    def push(self, ids, values, now):
+        """Append one sample per row; `values` is (n,) or (n, series).
+
+        Returns the number of samples each row has seen, this one included.
+        """
+        counts = self._counts[ids]
+        values = np.asarray(values, dtype=np.float64).reshape(len(ids), self.series)
+        self._samples[ids, :, counts % self.window] = values
+        counts += 1
+        self._counts[ids] = counts
+        self._last_seen[ids] = now
+        return counts
+
+    def counts(self, ids):
+        return self._counts[ids]
+
+    def moments(self, ids):
+        """Window mean and std of `ids`, each shaped (n, series)."""
+        window = self._samples[ids]
+        return window.mean(axis=2), window.std(axis=2)
+
+    def _evict(self, rows):
+        for row in rows.tolist():
+            del self._rows[self._keys[row]]
+            self._keys[row] = None
+            self._free.append(row)
+        self._counts[rows] = 0
+        self._last_seen[rows] = np.inf
+
+    def _compact(self):
+        rows = np.array(sorted(self._rows.values()), dtype=np.intp)
+        capacity = self._min_capacity
+        while capacity < 2 * len(rows):
+            capacity *= 2
+        keys = [self._keys[row] for row in rows.tolist()]
+        self._resize(capacity, rows)
+        self._keys = keys + [None] * (capacity - len(keys))
+        self._rows = {key: row for row, key in enumerate(keys)}
+        self._free = []
+        self._next = len(keys)
+
+    def expire(self, now=None):
+        """Evict idle keys (TTL) and the least recent ones over max_keys."""
+        now = time.time() if now is None else now
+        evicted = 0
+        if self.ttl is not None:
+            stale = np.flatnonzero(self._last_seen[: self._next] < now - self.ttl)
+            self._evict(stale)
+            self.evicted_ttl += len(stale)
+            evicted += len(stale)
+        excess = len(self._rows) - self.max_keys if self.max_keys else 0
+        if excess > 0:
+            oldest = np.argpartition(self._last_seen[: self._next], excess - 1)
+            self._evict(oldest[:excess])
+            self.evicted_lru += excess
+            evicted += excess
+        if self.capacity > self._min_capacity and len(self._rows) < self.capacity // 4:
+            self._compact()
+        return evicted
+
+    def memory_bytes(self):
+        return self._samples.nbytes + self._counts.nbytes + self._last_seen.nbytes
+
+    def state_stats(self):
+        return {
+            "keys": len(self._rows),
+            "capacity": self.capacity,
+            "evicted_ttl": self.evicted_ttl,
+            "evicted_lru": self.evicted_lru,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+class AdaptiveThresholdPlugin(ArrayDetectionPlugin):
+    """Rilevamento basato su soglie adattive (media mobile, dev. std).
+
+    The last `window` throughput samples of every key live in a
+    KeyedWindows ring array, so a cycle compares the new samples with
+    mean + std_factor * std of the previous ones for all keys with a full
+    window, then writes them, in a single vectorized pass. State is
+    bounded by `ttl` and `max_keys`.
+    """
+
+    def __init__(
+        self, window=10, std_factor=3, capacity=1024, ttl=120, max_keys=100000
+    ):
         self.window = window
         self.std_factor = std_factor
-        self.history = {}
+        self.windows = KeyedWindows(
+            window, capacity=capacity, ttl=ttl, max_keys=max_keys
+        )
 
-    def analyze(self, stats):
+    def __len__(self):
+        return len(self.windows)
+
+    @property
+    def capacity(self):
+        return self.windows.capacity
+
+    @property
+    def evicted_ttl(self):
+        return self.windows.evicted_ttl
+
+    @property
+    def evicted_lru(self):
+        return self.windows.evicted_lru
+
+    def expire(self, now=None):
+        return self.windows.expire(now)
+
+    def memory_bytes(self):
+        return self.windows.memory_bytes()
+
+    def state_stats(self):
+        return self.windows.state_stats()
+
+    def analyze(self, stats, now=None):
+        now = time.time() if now is None else now
+        keys = []
+        values = []
+        for kind, dpid, table in iter_stat_tables(stats):
+            keys.extend([(kind, dpid, key) for key in table])
+            values.extend([entry.get("throughput", 0) for entry in table.values()])
         anomalies = []
-        for key, value in stats.items():
-            throughput = value.get("throughput", 0)
-            hist = self.history.setdefault(key, [])
-            hist.append(throughput)
-            if len(hist) > self.window:
-                hist.pop(0)
-            if len(hist) >= self.window:
-                mean = np.mean(hist)
-                std = np.std(hist)
-                if throughput > mean + self.std_factor * std:
-                    anomalies.append(
-                        {"key": key, "throughput": throughput, "mean": mean, "std": std}
-                    )
+        if keys:
+            values = np.array(values, dtype=np.float64)
+            for index, mean, std in self._score(keys, values, now):
+                kind, dpid, key = keys[index]
+                anomaly = {
+                    "key": key,
+                    "throughput": float(values[index]),
+                    "mean": mean,
+                    "std": std,
+                }
+                if dpid is not None:
+                    anomaly["dpid"] = dpid
+                    anomaly["kind"] = kind
+                anomalies.append(anomaly)
+        self.windows.expire(now)
+        return anomalies
+
+    def analyze_rows(self, rows, now):
+        anomalies = []
+        if len(rows):
+            values = np.array(rows["throughput"], dtype=np.float64)
+            anomalies = [
+                {
+                    "index": index,
+                    "throughput": float(values[index]),
+                    "mean": mean,
+                    "std": std,
+                }
+                for index, mean, std in self._score(
+                    rows["key_id"].tolist(), values, now
+                )
+            ]
+        self.windows.expire(now)
+        return anomalies
+
+    def _score(self, keys, values, now):
+        """Record one sample per key; return (batch index, mean, std) hits."""
+        ids = self.windows.rows_for(keys)
+        # Baseline sui `window` campioni precedenti, senza quello corrente:
+        # incluso nella finestra, il suo z-score non supererebbe mai
+        # sqrt(window - 1) (= 3 con i valori di default)
+        ready = np.flatnonzero(self.windows.counts(ids) >= self.window)
+        if len(ready):
+            mean, std = self.windows.moments(ids[ready])
+        self.windows.push(ids, values, now)
+        if not len(ready):
+            return []
+        mean, std = mean[:, 0], std[:, 0]
+        hits = np.flatnonzero(values[ready] > mean + self.std_factor * std)
+        return [
+            (int(ready[hit]), float(mean[hit]), float(std[hit]))
+            for hit in hits.tolist()
+        ]
+
+
+class EntropyDDoSPlugin(ArrayDetectionPlugin):
+    """Distributed DoS detection from the entropy of traffic sources.
+
+    For every destination (victim) the Shannon entropy of its sources,
+    weighted by packet rate, is computed for the whole stats batch with
+    NumPy group-by operations. A window of the last `window` cycles per
+    victim gives the baseline; victim state is bounded by `ttl` and
+    `max_victims`. When a victim's traffic rises above its baseline, an
+    entropy spike means many sources converging on it (each possibly
+    under the per-host thresholds) and a collapse means a few sources
+    taking it over. The entropy of destinations over all traffic is
+    tracked the same way to catch traffic concentrating on one host.
+
+    Flow stats carry no L4 ports (forwarding entries are L2), so sources
+    and destinations are the MAC and IPv4 addresses of the stats keys.
+    """
+
+    def __init__(
+        self,
+        window=12,
+        std_factor=3,
+        min_rate=100,
+        min_sources=5,
+        min_delta=0.5,
+        ttl=300,
+        max_victims=10000,
+    ):
+        self.window = window
+        self.std_factor = std_factor
+        self.min_rate = min_rate  # pacchetti/s verso la vittima
+        self.min_sources = min_sources
+        self.min_delta = min_delta  # bit: ignora variazioni piu' piccole
+        # Serie per vittima: entropia delle sorgenti, traffico totale
+        self.victims = KeyedWindows(window, series=2, ttl=ttl, max_keys=max_victims)
+        self.global_history = deque(maxlen=window)
+        self._builder = StatsRowBuilder(ttl=ttl)
+
+    def analyze(self, stats, now=None):
+        now = time.time() if now is None else now
+        columns, _ = self._builder.build(stats, now)
+        return self.analyze_rows(rows_from_columns(columns), now)
+
+    @staticmethod
+    def _grouped_entropy(groups, items, weights, n_groups):
+        """Entropy (bits) of `items` within each group, weighted."""
+        pairs, pair_index = np.unique(
+            np.stack((groups.astype(np.uint64), items), axis=1),
+            axis=0,
+            return_inverse=True,
+        )
+        pair_weight = np.bincount(pair_index.ravel(), weights=weights)
+        pair_group = pairs[:, 0].astype(np.intp)
+        total = np.bincount(pair_group, weights=pair_weight, minlength=n_groups)
+        p = pair_weight / total[pair_group]
+        entropy = -np.bincount(pair_group, weights=p * np.log2(p), minlength=n_groups)
+        distinct = np.bincount(pair_group, minlength=n_groups)
+        return entropy, total, distinct
+
+    def analyze_rows(self, rows, now):
+        anomalies = []
+        valid = (rows["src"] != 0) & (rows["dst"] != 0) & (rows["packet_rate"] > 0)
+        if valid.any():
+            rows = rows[valid]
+            weights = rows["packet_rate"]
+            # La vittima e' (tipo di indirizzo, destinazione)
+            victim_codes = (rows["kind"].astype(np.uint64) & 0xFF) << 56 | rows["dst"]
+            victims, victim_index = np.unique(victim_codes, return_inverse=True)
+            entropy, rate, sources = self._grouped_entropy(
+                victim_index, rows["src"], weights, len(victims)
+            )
+            anomalies.extend(self._check_victims(victims, entropy, rate, sources, now))
+            anomalies.extend(self._check_global(rate, now))
+        self.victims.expire(now)
+        return anomalies
+
+    def _check_victims(self, victims, entropy, rate, sources, now):
+        ids = self.victims.rows_for(victims.tolist())
+        # Baseline calcolata prima di aggiungere il ciclo corrente
+        ready = np.flatnonzero(self.victims.counts(ids) >= self.window)
+        if len(ready):
+            mean, std = self.victims.moments(ids[ready])
+        self.victims.push(ids, np.stack((entropy, rate), axis=1), now)
+        if not len(ready):
+            return []
+        h_mean, r_mean = mean[:, 0], mean[:, 1]
+        h_std, r_std = std[:, 0], std[:, 1]
+        h, r = entropy[ready], rate[ready]
+
+        surge = (r >= self.min_rate) & (r > r_mean + self.std_factor * r_std)
+        band = np.maximum(self.std_factor * h_std, self.min_delta)
+        spike = surge & (h > h_mean + band) & (sources[ready] >= self.min_sources)
+        collapse = surge & (h < h_mean - band)
+
+        anomalies = []
+        for i in np.flatnonzero(spike | collapse).tolist():
+            code = int(victims[ready[i]])
+            kind = code >> 56
+            anomalies.append(
+                {
+                    "key": f"victim_{format_address(kind, code & (2**56 - 1))}",
+                    "type": "entropy_spike" if spike[i] else "entropy_collapse",
+                    "entropy": float(h[i]),
+                    "mean": float(h_mean[i]),
+                    "std": float(h_std[i]),
+                    "sources": int(sources[ready[i]]),
+                    "packet_rate": float(r[i]),
+                }
+            )
+        return anomalies
+
+    def _check_global(self, rate, now):
+        total = rate.sum()
+        p = rate / total
+        entropy = float(-(p * np.log2(p)).sum())
+        history = self.global_history
+        anomalies = []
+        if len(history) == history.maxlen:
+            past = np.array(history)
+            h_mean, r_mean = past.mean(axis=0)
+            h_std, r_std = past.std(axis=0)
+            band = max(self.std_factor * h_std, self.min_delta)
+            if (
+                total >= self.min_rate
+                and total > r_mean + self.std_factor * r_std
+                and entropy < h_mean - band
+            ):
+                anomalies.append(
+                    {
+                        "key": "destinations",
+                        "type": "destination_entropy_collapse",
+                        "entropy": entropy,
+                        "mean": float(h_mean),
+                        "std": float(h_std),
+                        "packet_rate": float(total),
+                    }
+                )
+        history.append((entropy, total))
         return anomalies
 
 
@@ -44,47 +529,122 @@ class Detector:
         self.plugins = []
         self.lock = threading.Lock()
         self.logger = logging.getLogger("Detector")
+        self.hot_log = RateLimitedLogger(self.logger, rate=1.0, burst=5)
         self.running = True
         self.interval = interval  # <-- Ora funziona
+        self.last_version = None  # versione dell'ultimo snapshot analizzato
+        self.skipped_cycles = 0
+        # Plugin eseguiti in processi separati (vedi add_plugin)
+        self.workers = []
+        self._row_builder = StatsRowBuilder()
+        self._shared_rows = None
         # Aggiungi plugin di default
         self.plugins.append(AdaptiveThresholdPlugin())
+        self.plugins.append(EntropyDDoSPlugin())
         # COMMENTA QUESTA RIGA per disabilitare il thread automatico
         # self.thread = threading.Thread(target=self.run, daemon=True)
         # self.thread.start()
 
-    def add_plugin(self, plugin):
+    def add_plugin(self, plugin, process=False, timeout=2.0):
+        """Register a plugin, optionally in its own worker process.
+
+        Process plugins must implement analyze_rows (ArrayDetectionPlugin):
+        they read the stats from shared memory off the GIL of the Ryu
+        process, and a call over `timeout` seconds is abandoned and the
+        worker restarted.
+        """
+        if process and not isinstance(plugin, ArrayDetectionPlugin):
+            raise TypeError("process plugins must implement analyze_rows")
+        with self.lock:
+            if process:
+                self.workers.append(PluginWorker(plugin, timeout=timeout))
+            else:
+                self.plugins.append(plugin)
+
+    def _dispatch(self, stats, now):
+        # Scrive le righe in memoria condivisa e avvia i worker
+        columns, keys = self._row_builder.build(stats, now)
+        if self._shared_rows is None:
+            self._shared_rows = SharedStatsBuffer()
+        self._shared_rows.fill(columns)
+        descriptor = self._shared_rows.descriptor()
+        for worker in self.workers:
+            worker.submit(descriptor, now)
+        return keys
+
+    def _collect(self, keys):
+        # Raccoglie i risultati dei worker, ognuno entro il proprio timeout
+        anomalies = []
+        for worker in self.workers:
+            for anomaly in worker.collect():
+                if "index" in anomaly:
+                    kind, dpid, key = keys[anomaly.pop("index")]
+                    anomaly["key"] = key
+                    if dpid is not None:
+                        anomaly["dpid"] = dpid
+                        anomaly["kind"] = kind
+                anomaly.setdefault("plugin", worker.name)
+                anomalies.append(anomaly)
+        return anomalies
+
+    def worker_stats(self):
         with self.lock:
-            self.plugins.append(plugin)
+            return [worker.stats() for worker in self.workers]
 
     def analyze_stats(self, stats):
         anomalies = []
         with self.lock:
+            keys = self._dispatch(stats, time.time()) if self.workers else None
+            # I plugin in-process girano mentre i worker lavorano
             for plugin in self.plugins:
                 anomalies.extend(plugin.analyze(stats))
+            if keys is not None:
+                anomalies.extend(self._collect(keys))
         if anomalies:
-            self.logger.info(f"Anomalie rilevate: {anomalies}")
+            # Count plus a short preview: the full list can be huge
+            self.hot_log.info(
+                "Anomalie rilevate: %d (prime: %s)", len(anomalies), anomalies[:3]
+            )
             self.notify_anomalies(anomalies)
         return anomalies
 
     def run(self):
         while self.running:
-            stats = self.controller.monitor.get_stats()
-            self.logger.info(
-                f"Analyzing stats: {len(stats)} entries"
-            )  # <-- AGGIUNGI QUESTA RIGA
+            version, stats = self.controller.monitor.get_snapshot()
+            if version == self.last_version:
+                # Nessuna nuova statistica dall'ultimo ciclo
+                self.skipped_cycles += 1
+                time.sleep(self.interval)
+                continue
+            self.last_version = version
+            self.logger.debug("Analyzing stats v%d: %d entries", version, len(stats))
             anomalies = self.analyze_stats(stats)
             if anomalies:
-                self.logger.info(f"Anomalies detected: {anomalies}")
-                for anomaly in anomalies:
-                    self.notify_anomalies(anomaly)
+                self.hot_log.info("Anomalies detected: %d", len(anomalies))
+                # Polling piu' fitto sugli switch coinvolti (tutti se ignoti)
+                for dpid in {anomaly.get("dpid") for anomaly in anomalies}:
+                    self.controller.monitor.report_activity(dpid)
             time.sleep(self.interval)
 
     def stop(self):
         self.running = False
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+            if self._shared_rows is not None:
+                self._shared_rows.close()
+                self._shared_rows = None
 
     def notify_anomalies(self, anomalies):
-        # Notifica le anomalie al controller o mitigator
-        # Puoi implementare una callback, una coda, o chiamare direttamente il mitigator
+        # Notifica le anomalie al mitigator tramite il suo bus: le
+        # segnalazioni ripetute per lo stesso flusso vengono coalescate e,
+        # se la coda e' piena, il detector attende o le scarta
         if hasattr(self.controller, "mitigator"):
-            for anomaly in anomalies:
-                self.controller.mitigator.handle_anomaly(anomaly)
+            result = self.controller.mitigator.anomaly_bus.publish(anomalies)
+            # Le coalescate sono volute: solo la coda piena perde anomalie
+            if result.dropped:
+                self.hot_log.warning(
+                    "Anomaly bus full: %d of %d anomalies dropped",
+                    result.dropped,
+                    len(anomalies),
+                )
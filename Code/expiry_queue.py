@@ -0,0 +1,42 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class ExpiryQueue:
+    """Deadlines of keyed entries in a heap, popped when due.
+
+    Scheduling and popping cost O(log n) and only the entries that
+    actually expire are visited, however many are pending. Rescheduling a
+    key just pushes a new deadline: the caller compares a popped deadline
+    with the entry's current one and ignores the stale ones.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._heap = []  # (scadenza, progressivo, chiave)
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, key, until):
+        with self.lock:
+            heapq.heappush(self._heap, (until, next(self._seq), key))
+
+    def pop_due(self, now=None):
+        """Pop the entries due at `now`; return a list of (key, until)."""
+        now = time.time() if now is None else now
+        due = []
+        with self.lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                until, _, key = heapq.heappop(heap)
+                due.append((key, until))
+        return due
+
+    def next_due(self):
+        """Earliest deadline, or None when nothing is scheduled."""
+        with self.lock:
+            return self._heap[0][0] if self._heap else None
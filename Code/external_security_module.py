@@ -42,30 +42,24 @@ class ExternalSecurityModule:
     def _add_threat_intelligence_policies(self):
         """Add policies based on known threats."""
 
-        # Block known malicious IPs
+        # Block known malicious IPs (one update for the whole feed)
+        policies = {}
         for ip in self.known_malicious_ips:
-            policy = {
+            policies[f"malicious_ip_{ip}"] = {
                 "ipv4_src": ip,
                 "description": f"Known malicious IP: {ip}",
                 "severity": "high",
             }
-            self.mitigator.add_external_policy(f"malicious_ip_{ip}", policy)
+        self.mitigator.add_external_policies(policies)
 
-        # Block suspicious MAC patterns
+        # Block suspicious MAC patterns (prefix match)
         for i, mac_pattern in enumerate(self.suspicious_mac_patterns):
             policy = {
-                "eth_src_pattern": mac_pattern,  # This would need pattern matching implementation
+                "eth_src_pattern": mac_pattern,
                 "description": f"Suspicious MAC pattern: {mac_pattern}",
                 "severity": "medium",
             }
-            # For simplicity, we'll add a specific MAC that starts with this pattern
-            specific_mac = mac_pattern + "00:00:01"
-            policy_simple = {
-                "eth_src": specific_mac,
-                "description": f"Suspicious MAC: {specific_mac}",
-                "severity": "medium",
-            }
-            self.mitigator.add_external_policy(f"suspicious_mac_{i}", policy_simple)
+            self.mitigator.add_external_policy(f"suspicious_mac_{i}", policy)
 
     def _monitor_threats(self):
         """Monitor for new threats and update policies."""
@@ -91,21 +85,22 @@ class ExternalSecurityModule:
         # Example: simulate finding a new malicious IP
         import random
 
+        policies = {}
         if random.random() < 0.1:  # 10% chance to "discover" new threat
             new_malicious_ip = f"192.168.1.{random.randint(200, 254)}"
             if new_malicious_ip not in self.known_malicious_ips:
                 self.known_malicious_ips.append(new_malicious_ip)
 
                 # Add policy for new threat
-                policy = {
+                policies[f"new_threat_{new_malicious_ip}"] = {
                     "ipv4_src": new_malicious_ip,
                     "description": f"Newly discovered malicious IP: {new_malicious_ip}",
                     "severity": "high",
                 }
-                self.mitigator.add_external_policy(
-                    f"new_threat_{new_malicious_ip}", policy
-                )
-                self.logger.warning(f"Added policy for new threat: {new_malicious_ip}")
+        # Le minacce trovate nel controllo entrano in un solo aggiornamento
+        if policies:
+            self.mitigator.add_external_policies(policies)
+            self.logger.warning(f"Added policies for new threats: {list(policies)}")
 
     def block_emergency_target(self, target_ip, duration=300):
         """Emergency blocking function for administrators."""
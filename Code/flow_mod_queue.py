@@ -0,0 +1,291 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class _Batch:
+    __slots__ = (
+        "first_xid",
+        "barrier_xid",
+        "size",
+        "oldest",
+        "sent_at",
+        "errors",
+        "callbacks",
+    )
+
+    def __init__(self, first_xid, barrier_xid, size, oldest, sent_at, callbacks):
+        self.first_xid = first_xid
+        self.barrier_xid = barrier_xid
+        self.size = size
+        self.oldest = oldest  # accodamento della modifica piu' vecchia
+        self.sent_at = sent_at
+        self.errors = 0
+        self.callbacks = callbacks  # xid -> on_error del flow mod
+
+
+class _SwitchQueue:
+    __slots__ = (
+        "datapath",
+        "pending",
+        "outstanding",
+        "send_lock",
+        "submitted",
+        "coalesced",
+        "sent",
+        "batches",
+        "confirmed",
+        "errors",
+        "timeouts",
+        "latency",
+        "last_latency",
+        "max_latency",
+    )
+
+    def __init__(self, datapath):
+        self.datapath = datapath
+        self.pending = OrderedDict()  # chiave -> (flow mod, istante di accodamento)
+        self.outstanding = deque()  # batch inviati in attesa del barrier reply
+        self.send_lock = threading.Lock()  # un solo flush per switch alla volta
+        self.submitted = 0
+        self.coalesced = 0
+        self.sent = 0
+        self.batches = 0
+        self.confirmed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latency = None  # media mobile esponenziale, secondi
+        self.last_latency = None
+        self.max_latency = 0.0
+
+
+class FlowModPipeline:
+    """Per-datapath flow-mod queues flushed in batches closed by a barrier.
+
+    A flow mod for the same (table, priority, match) as one still queued
+    replaces it, so a burst of updates to one rule costs one message, and
+    a strict delete cancels a queued add of the same rule. The
+    flusher thread (run) waits `linger` seconds after the first update to
+    let a burst accumulate, then writes up to `max_batch` mods and an
+    OFPBarrierRequest to the switch in a single send. The barrier reply
+    confirms the whole batch and gives its install latency, measured from
+    the oldest update in the batch; OFPErrorMsg replies are matched to the
+    batch by xid, and the mod's `on_error` callback, if any, is called
+    with the error. A caller finding `max_pending` mods queued for a switch
+    flushes it itself, which bounds the queues.
+    """
+
+    def __init__(
+        self, max_batch=512, linger=0.002, max_pending=20000, reply_timeout=10
+    ):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.max_pending = max_pending
+        self.reply_timeout = reply_timeout
+        self.running = True
+        self._cond = threading.Condition()
+        self._queues = {}  # dpid -> _SwitchQueue
+        self.recent_errors = deque(maxlen=32)
+
+    @staticmethod
+    def _key(mod):
+        return (mod.table_id, mod.priority, mod.command, tuple(mod.match.items()))
+
+    def submit(self, datapath, mod, now=None, on_error=None):
+        """Queue a flow mod for `datapath`.
+
+        `on_error(msg)` is called if the switch rejects the mod.
+        """
+        now = time.time() if now is None else now
+        key = self._key(mod)
+        with self._cond:
+            queue = self._queues.get(datapath.id)
+            if queue is None or queue.datapath is not datapath:
+                # Switch nuovo o riconnesso: le modifiche vecchie vanno perse
+                queue = self._queues[datapath.id] = _SwitchQueue(datapath)
+            queue.submitted += 1
+            queued = queue.pending.pop(key, None)
+            if queued is not None:
+                queue.coalesced += 1
+                now = min(now, queued[1])
+            if mod.command == datapath.ofproto.OFPFC_DELETE_STRICT:
+                # Un'aggiunta della stessa regola ancora in coda e' inutile
+                added = key[:2] + (datapath.ofproto.OFPFC_ADD,) + key[3:]
+                if queue.pending.pop(added, None) is not None:
+                    queue.coalesced += 1
+            queue.pending[key] = (mod, now, on_error)
+            full = len(queue.pending) >= self.max_pending
+            self._cond.notify()
+        if full:
+            self.flush(datapath.id)
+
+    def _send_batch(self, queue):
+        """Send one batch of `queue` and its barrier; return its size."""
+        with self._cond:
+            pending = queue.pending
+            size = min(len(pending), self.max_batch)
+            if not size:
+                return 0
+            items = [pending.popitem(last=False)[1] for _ in range(size)]
+        datapath = queue.datapath
+        buffers = []
+        first_xid = None
+        callbacks = {}
+        for mod, _, on_error in items:
+            xid = datapath.set_xid(mod)
+            if first_xid is None:
+                first_xid = xid
+            if on_error is not None:
+                callbacks[xid] = on_error
+            mod.serialize()
+            buffers.append(mod.buf)
+        barrier = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+        barrier_xid = datapath.set_xid(barrier)
+        barrier.serialize()
+        buffers.append(barrier.buf)
+        batch = _Batch(
+            first_xid,
+            barrier_xid,
+            size,
+            min(item[1] for item in items),
+            time.time(),
+            callbacks,
+        )
+        with self._cond:
+            queue.outstanding.append(batch)
+            queue.sent += size
+            queue.batches += 1
+        datapath.send(b"".join(buffers))
+        return size
+
+    def flush(self, dpid=None):
+        """Send everything queued (for `dpid` only, if given)."""
+        with self._cond:
+            if dpid is None:
+                queues = list(self._queues.values())
+            else:
+                queues = [self._queues[dpid]] if dpid in self._queues else []
+        sent = 0
+        for queue in queues:
+            with queue.send_lock:
+                while True:
+                    size = self._send_batch(queue)
+                    if not size:
+                        break
+                    sent += size
+        return sent
+
+    def _expire(self, now):
+        with self._cond:
+            for queue in self._queues.values():
+                outstanding = queue.outstanding
+                while outstanding and now - outstanding[0].sent_at > self.reply_timeout:
+                    outstanding.popleft()
+                    queue.timeouts += 1
+
+    def run(self):
+        # Thread di flush
+        while self.running:
+            with self._cond:
+                if not any(q.pending for q in self._queues.values()):
+                    self._cond.wait(1.0)
+            if self.linger:
+                time.sleep(self.linger)  # lascia accumulare il burst
+            self.flush()
+            self._expire(time.time())
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        self.flush()
+
+    def barrier_reply(self, dpid, xid, now=None):
+        """Confirm the batches up to the one closed by barrier `xid`.
+
+        Returns the number of flow mods confirmed.
+        """
+        now = time.time() if now is None else now
+        with self._cond:
+            queue = self._queues.get(dpid)
+            if queue is None or not any(
+                b.barrier_xid == xid for b in queue.outstanding
+            ):
+                return 0
+            # Il barrier garantisce che anche i batch precedenti sono applicati
+            confirmed = 0
+            while queue.outstanding:
+                batch = queue.outstanding.popleft()
+                confirmed += batch.size
+                latency = now - batch.oldest
+                queue.last_latency = latency
+                queue.max_latency = max(queue.max_latency, latency)
+                if queue.latency is None:
+                    queue.latency = latency
+                else:
+                    queue.latency += 0.2 * (latency - queue.latency)
+                if batch.barrier_xid == xid:
+                    break
+            queue.confirmed += confirmed
+            return confirmed
+
+    def error(self, dpid, msg, now=None):
+        """Account an OFPErrorMsg; return True if it belongs to a batch."""
+        now = time.time() if now is None else now
+        with self._cond:
+            queue = self._queues.get(dpid)
+            if queue is None:
+                return False
+            for batch in queue.outstanding:
+                if batch.first_xid <= msg.xid <= batch.barrier_xid:
+                    batch.errors += 1
+                    queue.errors += 1
+                    self.recent_errors.append(
+                        {
+                            "dpid": dpid,
+                            "xid": msg.xid,
+                            "type": msg.type,
+                            "code": msg.code,
+                            "time": now,
+                        }
+                    )
+                    on_error = batch.callbacks.pop(msg.xid, None)
+                    break
+            else:
+                return False
+        # Fuori dal lock: il callback aggiorna lo stato del chiamante
+        if on_error is not None:
+            on_error(msg)
+        return True
+
+    def depth(self, dpid=None):
+        with self._cond:
+            if dpid is not None:
+                queue = self._queues.get(dpid)
+                return len(queue.pending) if queue is not None else 0
+            return sum(len(q.pending) for q in self._queues.values())
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_batch": self.max_batch,
+                "max_pending": self.max_pending,
+                "switches": {
+                    str(dpid): {
+                        "queue_depth": len(q.pending),
+                        "outstanding_batches": len(q.outstanding),
+                        "submitted": q.submitted,
+                        "coalesced": q.coalesced,
+                        "sent": q.sent,
+                        "batches": q.batches,
+                        "confirmed": q.confirmed,
+                        "errors": q.errors,
+                        "timeouts": q.timeouts,
+                        "install_latency": q.latency,
+                        "last_install_latency": q.last_latency,
+                        "max_install_latency": q.max_latency,
+                    }
+                    for dpid, q in self._queues.items()
+                },
+                "recent_errors": list(self.recent_errors),
+            }
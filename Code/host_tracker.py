@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+
+
+class HostTracker:
+    """Access switch and port of each host, learned from packet-ins.
+
+    A host's first frame reaches the controller from its ingress switch
+    before any other switch sees it (the others only get it once the
+    controller forwards it), so the first location where a MAC is learned
+    is its access switch and port. A port where a MAC already located
+    behind another switch shows up is a link between switches. A MAC
+    showing up on another port of a switch that already knew it has
+    moved, and its location is learned again from there, but only on its
+    access switch or on a port not known as a link: elsewhere the frame
+    is in transit and a new port only means a new path. IPv4 addresses
+    map to the MAC that last sent from them. At most `max_hosts` MACs and addresses are kept, least recently
+    seen evicted first.
+    """
+
+    def __init__(self, max_hosts=65536):
+        self.max_hosts = max_hosts
+        self.lock = threading.Lock()
+        self.moves = 0
+        self._hosts = OrderedDict()  # mac -> [ingress (dpid, porta), {dpid: porta}]
+        self._ips = OrderedDict()  # ip -> mac
+        self._links = set()  # (dpid, porta) verso altri switch
+
+    def __len__(self):
+        return len(self._hosts)
+
+    @staticmethod
+    def _touch(table, key, value, limit):
+        if key in table:
+            table.move_to_end(key)
+        elif len(table) >= limit:
+            table.popitem(last=False)
+        table[key] = value
+
+    def learn(self, dpid, port, mac, ip=None):
+        """Record a frame from `mac` (and `ip`) received on dpid:port."""
+        with self.lock:
+            host = self._hosts.get(mac)
+            if host is None:
+                host = [(dpid, port), {dpid: port}]
+            else:
+                known = host[1].get(dpid)
+                if known is None:
+                    host[1][dpid] = port
+                    if dpid != host[0][0]:
+                        self._links.add((dpid, port))
+                elif known != port:
+                    if dpid == host[0][0] or (dpid, port) not in self._links:
+                        self.moves += 1
+                        host = [(dpid, port), {dpid: port}]
+                    else:
+                        # Switch di transito: cambia solo il percorso
+                        host[1][dpid] = port
+            self._touch(self._hosts, mac, host, self.max_hosts)
+            if ip:
+                self._touch(self._ips, ip, mac, self.max_hosts)
+
+    def locate(self, mac=None, ip=None):
+        """(dpid, port) where `mac`, or the MAC behind `ip`, is attached."""
+        with self.lock:
+            if mac is None and ip is not None:
+                mac = self._ips.get(ip)
+            host = self._hosts.get(mac)
+            return host[0] if host is not None else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hosts": len(self._hosts),
+                "addresses": len(self._ips),
+                "max_hosts": self.max_hosts,
+                "moves": self.moves,
+                "links": len(self._links),
+            }
@@ -0,0 +1,168 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+_limiters = []
+_queue_handler = None
+_listener = None
+
+
+class _Site:
+    __slots__ = ("tokens", "last", "calls", "emitted", "suppressed", "pending")
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.last = now
+        self.calls = 0
+        self.emitted = 0
+        self.suppressed = 0
+        self.pending = 0  # soppressi dall'ultimo messaggio emesso
+
+
+class RateLimitedLogger:
+    """Logger wrapper with per-call-site rate limiting and sampling.
+
+    Messages use logging's %-style arguments, so nothing is formatted
+    unless the record is actually emitted. Each call site (or explicit
+    `key`) gets a token bucket of `rate` messages/s with bursts of
+    `burst`; with `sample` set, only one call in `sample` is considered.
+    Suppressed messages are counted and reported with the next message
+    emitted from the same site.
+    """
+
+    def __init__(self, logger, rate=1.0, burst=5, sample=1):
+        self.logger = logger
+        self.rate = rate
+        self.burst = burst
+        self.sample = sample
+        self._sites = {}
+        self._lock = threading.Lock()
+        _limiters.append(self)
+
+    def debug(self, msg, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self._log(logging.INFO, msg, args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, **kwargs)
+
+    def _log(self, level, msg, args, key=None, rate=None, burst=None, sample=None):
+        if not self.logger.isEnabledFor(level):
+            return
+        if key is None:
+            caller = sys._getframe(2)
+            key = (caller.f_code.co_filename, caller.f_lineno)
+        rate = self.rate if rate is None else rate
+        burst = self.burst if burst is None else burst
+        sample = self.sample if sample is None else sample
+        now = time.monotonic()
+
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = _Site(burst, now)
+            site.calls += 1
+            site.tokens = min(burst, site.tokens + (now - site.last) * rate)
+            site.last = now
+            if (site.calls - 1) % sample or site.tokens < 1:
+                site.suppressed += 1
+                site.pending += 1
+                return
+            site.tokens -= 1
+            site.emitted += 1
+            pending, site.pending = site.pending, 0
+
+        if pending:
+            msg = f"{msg} [%d similar messages suppressed]"
+            args = args + (pending,)
+        self.logger.log(level, msg, *args, stacklevel=3)
+
+    def stats(self):
+        with self._lock:
+            sites = [(key, s.emitted, s.suppressed) for key, s in self._sites.items()]
+        return {
+            "logger": self.logger.name,
+            "emitted": sum(s[1] for s in sites),
+            "suppressed": sum(s[2] for s in sites),
+            "sites": {
+                (
+                    f"{key[0].rsplit('/', 1)[-1]}:{key[1]}"
+                    if isinstance(key, tuple)
+                    else str(key)
+                ): {"emitted": emitted, "suppressed": suppressed}
+                for key, emitted, suppressed in sites
+            },
+        }
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Niente formattazione sul thread chiamante: il record resta nello
+        # stesso processo, il listener lo formatta quando lo scrive
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def enable_async_logging(max_queue=10000):
+    """Move the root handlers behind a bounded queue and a listener thread.
+
+    Log calls then only enqueue the record; formatting and I/O happen on
+    the listener thread, never on the OpenFlow event thread. When the
+    queue is full records are dropped and counted.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return _queue_handler
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_queue = queue.Queue(maxsize=max_queue)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    _listener.start()
+    atexit.register(disable_async_logging)
+    return _queue_handler
+
+
+def disable_async_logging():
+    """Flush the queue and give the handlers back to the root logger."""
+    global _queue_handler, _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _queue_handler = None
+    _listener = None
+
+
+def logging_stats():
+    """Suppression counters of every rate-limited logger plus queue drops."""
+    return {
+        "limiters": [limiter.stats() for limiter in _limiters],
+        "queue_dropped": _queue_handler.dropped if _queue_handler else 0,
+        "queue_size": _queue_handler.queue.qsize() if _queue_handler else 0,
+    }
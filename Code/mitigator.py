@@ -1,39 +1,149 @@
 import threading
 import logging
+import math
 import time
+from collections import OrderedDict
+from functools import partial
+from types import MappingProxyType
+
+from anomaly_bus import AnomalyBus
+from expiry_queue import ExpiryQueue
+from flow_mod_queue import FlowModPipeline
+from policy_classifier import PolicyClassifier
+from rule_compaction import ADD_AGGREGATE, ADD_EXACT, DELETE_EXACT
+from rule_compaction import RuleCompactor
+from verdict_cache import VerdictCache
+from logging_utils import RateLimitedLogger
+
+# Priorità delle regole OpenFlow: i drop devono sempre prevalere sul forwarding
+FORWARD_PRIORITY = 1
+BLOCK_PRIORITY = 10
 
 
 class Mitigator:
     def handle_anomaly(self, anomaly):
         # Riceve una segnalazione di anomalia dal detector e applica il blocco
-        # Si assume che anomaly['key'] sia compatibile con _flow_id
-        # Puoi personalizzare la logica di mapping qui
-        flow_id = anomaly.get("key")
-        # Trova un datapath disponibile
-        datapath = next(iter(self.controller.dps.values()), None)
+        flow_id = self._anomaly_flow_id(anomaly)
+        # Lo switch che ha segnalato l'anomalia, se l'ingresso non e' noto
+        dps = self.controller.dps
+        datapath = dps.get(anomaly.get("dpid")) or next(iter(dps.values()), None)
         if datapath and flow_id:
             self.apply_block(datapath, flow_id)
-            self.logger.info(f"Blocco automatico per anomalia: {flow_id}")
-
-    def run(self, interval=5):
-        # Thread per lo sblocco progressivo
+            self.hot_log.info("Blocco automatico per anomalia: %s", flow_id)
+
+    @staticmethod
+    def _anomaly_flow_id(anomaly):
+        # Traduce la chiave del detector ("src_dst" per i MAC,
+        # "tcp_src_dst"/"udp_src_dst" per IP) nella tupla di _flow_id
+        key = anomaly.get("key")
+        if isinstance(key, tuple):
+            return key
+        if not isinstance(key, str):
+            return None
+        parts = [None if p == "None" else p for p in key.split("_")]
+        if anomaly.get("kind") == "macs" or (
+            len(parts) == 2 and ":" in (parts[0] or "")
+        ):
+            flow_id = (parts[0], parts[-1], None, None, None, None)
+        elif len(parts) == 3 and parts[0] in ("tcp", "udp"):
+            flow_id = (None, None, parts[1], parts[2], None, None)
+        else:
+            return None  # es. ip_proto_N: nessun flusso da bloccare
+        return flow_id if any(flow_id) else None
+
+    def handle_anomalies(self, anomalies):
+        # Un batch gia' coalescato dal bus: al piu' un'anomalia per flusso
+        for anomaly in anomalies:
+            self.handle_anomaly(anomaly)
+
+    def consume_anomalies(self, max_batch=256):
+        # Thread consumatore del bus delle anomalie
+        while getattr(self, "running", True):
+            batch = self.anomaly_bus.consume(max_batch=max_batch, timeout=1.0)
+            if not batch:
+                continue
+            self.hot_log.info("Anomaly batch: %d flows", len(batch))
+            try:
+                self.handle_anomalies(batch)
+            except Exception:
+                # Il consumatore non deve morire per una singola anomalia
+                self.logger.exception("Failed to handle anomaly batch")
+
+    def run(self, interval=1):
+        # Thread per lo sblocco progressivo: dorme fino alla prossima
+        # scadenza, al piu' `interval` secondi (le nuove scadenze aggiunte
+        # nel frattempo tardano al massimo di tanto)
         while getattr(self, "running", True):
             self.unblock_flows()
-            time.sleep(interval)
+            next_due = self._expiry.next_due()
+            delay = interval if next_due is None else next_due - time.time()
+            time.sleep(min(max(delay, 0.05), interval))
 
     def stop(self):
         self.running = False
+        self.flow_mods.stop()
 
     def __init__(self, controller):
         self.controller = controller
+        # I lock serializzano solo gli scrittori, che aggiornano i dict sul
+        # posto: il packet-in li legge senza lock con un singolo get
+        # (atomico), chi li scorre ne copia uno snapshot sotto lock
         self.lock = threading.Lock()
-        self.blocked_flows = {}
+        self._blocked_flows = {}
+        self.blocked_flows = MappingProxyType(self._blocked_flows)
+        # Drop installati per flusso:
+        # flow_id -> ((dpid, in_port, connessione, scadenza), ...).
+        # Un drop gia' presente non viene reinviato per ogni pacchetto
+        self._installed = OrderedDict()
+        self.max_installed = 100000
+        self._switch_epochs = {}  # dpid -> connessioni viste
+        self.installed_blocks = 0
+        self.redundant_blocks = 0
+        self.rejected_blocks = 0  # drop respinti dallo switch (es. tabella piena)
+        # Blocchi subiti per flusso, anche dopo la scadenza: il block_time
+        # cresce a ogni nuova rilevazione
+        self._offenses = OrderedDict()
+        self.max_offenses = 65536
+        # Scadenze di blocked_flows e shared_blocklist: lo sblocco visita
+        # solo le voci scadute. Sugli switch i drop scadono da soli con
+        # un hard_timeout pari alla durata del blocco
+        self._expiry = ExpiryQueue()
+        # I drop dovuti alle policy esterne (senza scadenza) vengono
+        # reinstallati dal packet-in finche' la policy esiste
+        self.policy_rule_timeout = 300
+        # Budget di drop per switch: oltre, i blocchi vengono aggregati in
+        # regole wildcard (stesso MAC, stessa /24, stessa porta UDP)
+        self.rule_budget = RuleCompactor(budget=1000, min_group=4, split_ratio=0.8)
         self.logger = logging.getLogger("Mitigator")
+        # Log per-pacchetto e per-blocco: limitati e formattati in differita
+        self.hot_log = RateLimitedLogger(self.logger, rate=1.0, burst=5)
 
-        # Shared data structure for collaborative blocking decisions
-        self.shared_blocklist = {}  # Shared between modules
-        self.external_policies = {}  # Policies from external modules/admins
+        # Shared data structure for collaborative blocking decisions:
+        # shared blocklist, external policies and their compiled classifier
         self.policy_lock = threading.Lock()  # Separate lock for policies
+        self._shared_blocklist = {}
+        self._external_policies = {}
+        self.shared_blocklist = MappingProxyType(self._shared_blocklist)
+        self.external_policies = MappingProxyType(self._external_policies)
+        self.policy_classifier = PolicyClassifier()
+        # Flussi bloccati da ciascuna policy esterna (flow_id -> policy_id),
+        # per togliere i loro drop quando la policy viene rimossa
+        self._policy_flows = OrderedDict()
+
+        # Cache dei verdetti di should_block: una modifica di blocked_flows
+        # o shared_blocklist invalida solo i verdetti di quel flusso, una
+        # delle external_policies tutti. Viene usata solo dal thread del
+        # packet-in.
+        self.verdict_cache = VerdictCache(max_entries=65536)
+        self.allow_verdict_ttl = 5
+
+        # Anomalie dal detector: coda limitata, coalescata per flusso,
+        # consumata a batch da consume_anomalies
+        self.anomaly_bus = AnomalyBus(max_pending=10000, coalesce_window=5)
+
+        # Flow mod accodati per switch e inviati a batch chiusi da un
+        # barrier dal thread flow_mods.run
+        self.flow_mods = FlowModPipeline(max_batch=512, linger=0.002)
 
     def _flow_id(self, pkt):
         # Identificatore granulare: MAC/IP/UDP port
@@ -50,143 +160,382 @@ class Mitigator:
             udp.get("dst_port"),
         )
 
+    def _verdict_key(self, flow_id, pkt):
+        # Le policy guardano anche protocollo e porte TCP, che non sono
+        # nel flow_id: vanno nella chiave per non condividere verdetti
+        ip = pkt.get("ip") or {}
+        tcp = pkt.get("tcp") or {}
+        return flow_id + (ip.get("proto"), tcp.get("src_port"), tcp.get("dst_port"))
+
     def should_block(self, pkt, datapath, in_port):
         flow_id = self._flow_id(pkt)
         now = time.time()
-
-        # Check controller's automatic blocking decisions
-        with self.lock:
-            block_info = self.blocked_flows.get(flow_id)
-            if block_info and block_info["until"] > now:
-                return flow_id
+        key = self._verdict_key(flow_id, pkt)
+
+        # La generazione va letta prima dello stato: se una policy cambia
+        # nel frattempo, il verdetto calcolato non viene cachato (le
+        # modifiche a un singolo flusso passano da verdict_cache.discard)
+        cache = self.verdict_cache
+        generation = cache.generation
+        cached = cache.get(key, now)
+        if cached is not None:
+            return flow_id if cached[0] else None
+
+        # Check controller's automatic blocking decisions (no lock)
+        block_info = self.blocked_flows.get(flow_id)
+        if block_info and block_info["until"] > now:
+            cache.put(key, True, block_info["until"], generation, flow_id)
+            return flow_id
 
         # Check shared blocklist and external policies
-        if self._should_block_by_policies(flow_id, pkt):
+        until = self._should_block_by_policies(flow_id, pkt)
+        if until:
+            cache.put(key, True, until, generation, flow_id)
             return flow_id
+        cache.put(key, False, now + self.allow_verdict_ttl, generation, flow_id)
 
         # Qui puoi aggiungere logica per decidere se bloccare in base a segnali dal Detector
         return None
 
     def _should_block_by_policies(self, flow_id, pkt):
-        """Check if flow should be blocked based on shared policies."""
-        with self.policy_lock:
-            # Check shared blocklist
-            if flow_id in self.shared_blocklist:
-                policy = self.shared_blocklist[flow_id]
-                if policy.get("until", 0) > time.time():
-                    self.logger.info(f"Flow blocked by shared policy: {flow_id}")
-                    return True
-
-            # Check external policies (pattern-based blocking)
-            for policy_id, policy in self.external_policies.items():
-                if self._flow_matches_policy(pkt, policy):
-                    self.logger.info(
-                        f"Flow blocked by external policy '{policy_id}': {flow_id}"
-                    )
-                    return True
-
-        return False
-
-    def _flow_matches_policy(self, pkt, policy):
-        """Check if a packet matches a policy pattern."""
-        eth = pkt.get("eth", {})
-        ip = pkt.get("ip", {})
-        udp = pkt.get("udp", {})
-        tcp = pkt.get("tcp", {})
+        """Check if flow should be blocked based on shared policies.
+
+        Returns the time the block holds until (math.inf for external
+        policies, which last until removed), or None if not blocked.
+        """
+        # Check shared blocklist
+        policy = self.shared_blocklist.get(flow_id)
+        if policy and policy.get("until", 0) > time.time():
+            self.hot_log.info("Flow blocked by shared policy: %s", flow_id)
+            return policy["until"]
+
+        # Check external policies (pattern-based blocking)
+        policy_id = self.policy_classifier.match(pkt)
+        if policy_id is not None:
+            with self.policy_lock:
+                if policy_id not in self._external_policies:
+                    return None  # Rimossa durante il lookup
+                self._policy_flows.pop(flow_id, None)
+                self._policy_flows[flow_id] = policy_id
+                if len(self._policy_flows) > self.max_installed:
+                    self._policy_flows.popitem(last=False)
+            self.hot_log.info(
+                "Flow blocked by external policy '%s': %s", policy_id, flow_id
+            )
+            return math.inf
 
-        # Check MAC addresses
-        if policy.get("eth_src") and eth.get("src") != policy["eth_src"]:
-            return False
-        if policy.get("eth_dst") and eth.get("dst") != policy["eth_dst"]:
-            return False
+        return None
 
-        # Check IP addresses
-        if policy.get("ipv4_src") and ip.get("src") != policy["ipv4_src"]:
-            return False
-        if policy.get("ipv4_dst") and ip.get("dst") != policy["ipv4_dst"]:
-            return False
+    def cache_stats(self):
+        """Hit/miss counters of the verdict cache, for sizing it."""
+        return self.verdict_cache.stats()
 
-        # Check ports
-        if policy.get("udp_src") and udp and udp.get("src_port") != policy["udp_src"]:
-            return False
-        if policy.get("udp_dst") and udp and udp.get("dst_port") != policy["udp_dst"]:
-            return False
-        if policy.get("tcp_src") and tcp and tcp.get("src_port") != policy["tcp_src"]:
-            return False
-        if policy.get("tcp_dst") and tcp and tcp.get("dst_port") != policy["tcp_dst"]:
-            return False
+    def add_external_policy(self, policy_id, policy):
+        """Add an external blocking policy.
 
-        # Check protocol
-        if policy.get("ip_proto") and ip.get("proto") != policy["ip_proto"]:
-            return False
+        Raises ValueError if the policy has malformed or mistyped values.
+        """
+        self.add_external_policies({policy_id: policy})
 
-        return True
+    def add_external_policies(self, policies):
+        """Add several external policies with one cache invalidation.
 
-    def add_external_policy(self, policy_id, policy):
-        """Add an external blocking policy."""
+        Raises ValueError, without adding any policy, if one is malformed.
+        """
         with self.policy_lock:
-            self.external_policies[policy_id] = policy
-            self.logger.info(f"Added external policy '{policy_id}': {policy}")
+            self.policy_classifier.update(policies)
+            replaced = self._external_policies.keys() & policies.keys()
+            self._external_policies.update(policies)
+            self.verdict_cache.invalidate()
+            flows = self._take_policy_flows(replaced) if replaced else []
+        # Una policy sostituita puo' non coprire piu' i flussi gia' bloccati
+        self._release_policy_flows(flows)
+        for policy_id, policy in policies.items():
+            self.hot_log.info("Added external policy '%s': %s", policy_id, policy)
 
     def remove_external_policy(self, policy_id):
         """Remove an external blocking policy."""
         with self.policy_lock:
-            if policy_id in self.external_policies:
-                del self.external_policies[policy_id]
-                self.logger.info(f"Removed external policy '{policy_id}'")
-                return True
-            return False
+            if policy_id not in self._external_policies:
+                return False
+            self.policy_classifier.remove(policy_id)
+            del self._external_policies[policy_id]
+            self.verdict_cache.invalidate()
+            flows = self._take_policy_flows({policy_id})
+        self._release_policy_flows(flows)
+        self.logger.info(
+            f"Removed external policy '{policy_id}' ({len(flows)} blocked flows)"
+        )
+        return True
+
+    def _take_policy_flows(self, policy_ids):
+        # Da chiamare con self.policy_lock
+        flows = [f for f, p in self._policy_flows.items() if p in policy_ids]
+        for flow_id in flows:
+            del self._policy_flows[flow_id]
+        return flows
+
+    def _release_policy_flows(self, flows):
+        # Toglie dagli switch i drop installati per policy non piu' valide,
+        # salvo i flussi bloccati anche in altro modo. Se un'altra policy li
+        # copre, il prossimo packet-in li blocca di nuovo
+        now = time.time()
+        for flow_id in flows:
+            until = self._block_until(flow_id)
+            if until is not None and until > now:
+                continue
+            self._delete_block_rules(flow_id)
 
     def add_to_shared_blocklist(self, flow_id, duration=3600, source="external"):
         """Add a flow to the shared blocklist."""
+        now = time.time()
         with self.policy_lock:
-            self.shared_blocklist[flow_id] = {
-                "until": time.time() + duration,
+            self._shared_blocklist[flow_id] = {
+                "until": now + duration,
                 "source": source,
-                "added_at": time.time(),
+                "added_at": now,
             }
-            self.logger.info(
-                f"Added flow to shared blocklist: {flow_id} for {duration}s (source: {source})"
-            )
+            self.verdict_cache.discard(flow_id)
+            self._expiry.schedule(("shared", flow_id), now + duration)
+        self.logger.info(
+            f"Added flow to shared blocklist: {flow_id} for {duration}s (source: {source})"
+        )
 
     def remove_from_shared_blocklist(self, flow_id):
         """Remove a flow from the shared blocklist."""
         with self.policy_lock:
-            if flow_id in self.shared_blocklist:
-                del self.shared_blocklist[flow_id]
-                self.logger.info(f"Removed flow from shared blocklist: {flow_id}")
-                return True
-            return False
+            if self._shared_blocklist.pop(flow_id, None) is None:
+                return False
+            self.verdict_cache.discard(flow_id)
+        self._delete_block_rules(flow_id)
+        self.logger.info(f"Removed flow from shared blocklist: {flow_id}")
+        return True
 
     def get_all_policies(self):
         """Get all active policies for monitoring/debugging."""
         with self.policy_lock:
             return {
-                "shared_blocklist": dict(self.shared_blocklist),
-                "external_policies": dict(self.external_policies),
+                "shared_blocklist": dict(self._shared_blocklist),
+                "external_policies": dict(self._external_policies),
             }
 
+    def get_blocked_flows(self):
+        """Copy of the automatic blocks, for monitoring."""
+        with self.lock:
+            return dict(self._blocked_flows)
+
+    def block_placement(self, flow_id, datapath=None):
+        """Switch and port where the drop rule for `flow_id` goes.
+
+        Returns (datapath, in_port): the access switch and port of the
+        source (by MAC, else by IPv4 address) when known, so the traffic
+        is dropped before crossing any inter-switch link; otherwise
+        (`datapath`, None).
+        """
+        location = self.controller.hosts.locate(mac=flow_id[0], ip=flow_id[2])
+        if location is not None:
+            ingress = self.controller.dps.get(location[0])
+            if ingress is not None:
+                return ingress, location[1]
+        return datapath, None
+
     def apply_block(self, datapath, flow_id):
+        """Block `flow_id` for a detection event and install its drop rule.
+
+        `datapath` is the fallback switch when the source's ingress is not
+        known (see block_placement). A flow already blocked is left as it
+        is: the block time escalates with the offenses of the flow, one per
+        detection event, not with the packets that still reach the
+        controller. Returns the block info.
+        """
+        datapath, in_port = self.block_placement(flow_id, datapath)
+        now = time.time()
         with self.lock:
-            info = self.blocked_flows.get(flow_id, {"count": 0})
-            info["count"] += 1
-
-            # Limita il block_time a un massimo di 1 ora (3600 secondi)
-            # invece di raddoppiare indefinitamente
-            count = min(info["count"], 8)  # Limita a 2^7 = 128 moltiplicatore
-            block_time = 30 * (2 ** (count - 1))
-            block_time = min(block_time, 3600)  # Max 1 ora
-
-            info["until"] = time.time() + block_time
-            self.blocked_flows[flow_id] = info
-            self.logger.info(
-                f"Blocca flow {flow_id} per {block_time} secondi (count={info['count']})"
+            info = self.blocked_flows.get(flow_id)
+            escalated = info is None or info["until"] <= now
+            if escalated:
+                count = self._offenses.pop(flow_id, 0) + 1
+                self._offenses[flow_id] = count
+                if len(self._offenses) > self.max_offenses:
+                    self._offenses.popitem(last=False)
+
+                # Limita il block_time a un massimo di 1 ora (3600 secondi)
+                # invece di raddoppiare indefinitamente
+                exponent = min(count, 8)  # Limita a 2^7 = 128 moltiplicatore
+                block_time = 30 * (2 ** (exponent - 1))
+                block_time = min(block_time, 3600)  # Max 1 ora
+
+                info = {
+                    "count": count,
+                    "until": now + block_time,
+                    "dpid": datapath.id,
+                    "in_port": in_port,
+                    "placement": "ingress" if in_port is not None else "fallback",
+                }
+                self._blocked_flows[flow_id] = info
+                self.verdict_cache.discard(flow_id)
+                self._expiry.schedule(("block", flow_id), info["until"])
+        if escalated:
+            self.hot_log.info(
+                "Blocca flow %s per %s secondi (count=%d) su %s:%s",
+                flow_id,
+                block_time,
+                info["count"],
+                datapath.id,
+                in_port,
             )
+        self._install_block(datapath, flow_id, in_port, info["until"])
+        return info
+
+    def ensure_block(self, datapath, flow_id):
+        """Make sure the drop rule of an already blocked flow is installed.
+
+        Called for the packets of blocked flows that still reach the
+        controller: no escalation, and no flow mod if the rule is there.
+        """
+        datapath, in_port = self.block_placement(flow_id, datapath)
+        return self._install_block(
+            datapath, flow_id, in_port, self._block_until(flow_id)
+        )
 
-        # Costruisci OFPMatch solo con valori non-None
+    def _block_until(self, flow_id):
+        # Scadenza del blocco in vigore: automatico, condiviso o policy (None)
+        info = self.blocked_flows.get(flow_id)
+        if info is None:
+            info = self.shared_blocklist.get(flow_id)
+        return info["until"] if info is not None else None
+
+    @staticmethod
+    def _hard_timeout(until, now):
+        return min(max(int(math.ceil(until - now)), 1), 0xFFFF)
+
+    def _install_block(self, datapath, flow_id, in_port, until=None):
+        # Invia il drop solo se non e' gia' installato su quello switch.
+        # L'hard_timeout lo rimuove dallo switch alla scadenza del blocco
+        now = time.time()
+        if until is None or until == math.inf:
+            until = now + self.policy_rule_timeout
+        hard_timeout = self._hard_timeout(until, now)
+        with self.lock:
+            rule = (datapath.id, in_port, self._switch_epochs.get(datapath.id, 0))
+            rules = self._installed.pop(flow_id, ())
+            # Contano solo le regole ancora presenti sullo switch
+            rules = tuple(r for r in rules if r[3] > now and self._current(r))
+            self._installed[flow_id] = rules
+            if any(r[:3] == rule for r in rules):
+                self.redundant_blocks += 1
+                return False
+            self._installed[flow_id] = rules + (rule + (now + hard_timeout,),)
+            if len(self._installed) > self.max_installed:
+                self._installed.popitem(last=False)  # al piu' verra' reinstallato
+            self.installed_blocks += 1
+
+        ops = self.rule_budget.admit(
+            datapath.id, flow_id, in_port, now + hard_timeout, now
+        )
+        self._apply_rule_ops(datapath, ops, now)
+        return True
+
+    def _release_block_rules(self, flow_id, rules, force=False):
+        # Il blocco non serve piu': la regola esatta scade da sola (o va
+        # rimossa se `force`), un aggregato puo' essere diviso o rimosso
+        now = time.time()
+        for dpid, in_port, epoch, expires in rules:
+            datapath = self.controller.dps.get(dpid)
+            if datapath is None or epoch != self._switch_epochs.get(dpid, 0):
+                continue
+            ops = self.rule_budget.release(dpid, flow_id, now, force=force)
+            self._apply_rule_ops(datapath, ops, now)
+
+    def _delete_block_rules(self, flow_id):
+        # Sblocco anticipato: rimuove i drop del flusso dagli switch
+        with self.lock:
+            rules = self._installed.pop(flow_id, ())
+        self._release_block_rules(flow_id, rules, force=True)
+
+    def _apply_rule_ops(self, datapath, ops, now):
+        # Traduce le decisioni di RuleCompactor in flow mod
         parser = datapath.ofproto_parser
+        actions = []  # Nessuna azione = drop
+        epoch = self._switch_epochs.get(datapath.id, 0)
+        for op in ops:
+            kind = op[0]
+            if kind == ADD_EXACT:
+                _, flow_id, in_port, until = op
+                match = self._block_match(parser, flow_id, in_port)
+            elif kind == DELETE_EXACT:
+                _, flow_id, in_port = op
+                match = self._block_match(parser, flow_id, in_port)
+            else:
+                match = self._aggregate_match(parser, op[1])
+            if kind in (ADD_EXACT, ADD_AGGREGATE):
+                self.add_flow(
+                    datapath,
+                    BLOCK_PRIORITY,
+                    match,
+                    actions,
+                    hard_timeout=self._hard_timeout(op[-1], now),
+                    on_error=partial(self._block_rejected, datapath.id, epoch, op),
+                )
+            else:
+                self.delete_flow(datapath, BLOCK_PRIORITY, match)
+
+    def _block_rejected(self, dpid, epoch, op, msg):
+        # Il drop non e' sullo switch: dimenticarlo, cosi' il prossimo
+        # packet-in del flusso lo reinstalla (ensure_block)
+        if epoch != self._switch_epochs.get(dpid, 0):
+            return  # Switch riconnesso: stato gia' azzerato
+        flow_ids = self.rule_budget.reject(dpid, op)
+        with self.lock:
+            for flow_id in flow_ids:
+                rules = self._installed.get(flow_id)
+                if rules is None:
+                    continue
+                rules = tuple(r for r in rules if r[0] != dpid or r[2] != epoch)
+                if rules:
+                    self._installed[flow_id] = rules
+                else:
+                    del self._installed[flow_id]
+            self.rejected_blocks += len(flow_ids)
+        if flow_ids:
+            self.hot_log.warning(
+                "Drop rifiutato da %s (type=%s code=%s): %d flussi da reinstallare",
+                dpid,
+                msg.type,
+                msg.code,
+                len(flow_ids),
+            )
+
+    @staticmethod
+    def _aggregate_match(parser, key):
+        # Match wildcard di un aggregato (vedi rule_compaction.aggregate_keys)
+        kind, in_port = key[0], key[1]
+        match_kwargs = {}
+        if in_port is not None:
+            match_kwargs["in_port"] = in_port
+        if kind == "eth_src":
+            match_kwargs["eth_src"] = key[2]
+        elif kind == "ipv4_src":
+            match_kwargs["eth_type"] = 0x0800  # IPv4
+            match_kwargs["ipv4_src"] = (key[2].split("/")[0], "255.255.255.0")
+        else:  # udp_dst
+            match_kwargs["eth_type"] = 0x0800  # IPv4
+            match_kwargs["ipv4_dst"] = key[2]
+            match_kwargs["ip_proto"] = 17  # UDP
+            match_kwargs["udp_dst"] = key[3]
+        return parser.OFPMatch(**match_kwargs)
+
+    def _current(self, rule):
+        # La regola appartiene alla connessione attuale del suo switch
+        return rule[2] == self._switch_epochs.get(rule[0], 0)
+
+    @staticmethod
+    def _block_match(parser, flow_id, in_port=None):
+        # Costruisci OFPMatch solo con valori non-None
         match_kwargs = {}
 
+        if in_port is not None:
+            match_kwargs["in_port"] = in_port
         if flow_id[0]:  # eth_src
             match_kwargs["eth_src"] = flow_id[0]
         if flow_id[1]:  # eth_dst
@@ -203,10 +552,38 @@ class Mitigator:
         if flow_id[5]:  # udp_dst
             match_kwargs["ip_proto"] = 17  # UDP
             match_kwargs["udp_dst"] = flow_id[5]
+        return parser.OFPMatch(**match_kwargs)
 
-        match = parser.OFPMatch(**match_kwargs)
-        actions = []  # Nessuna azione = drop
-        self.add_flow(datapath, 10, match, actions)
+    def switch_connected(self, datapath):
+        """Forget the rules installed on a switch that (re)connected."""
+        with self.lock:
+            # Le regole della connessione precedente non valgono piu'
+            self._switch_epochs[datapath.id] = (
+                self._switch_epochs.get(datapath.id, 0) + 1
+            )
+        self.rule_budget.reset(datapath.id)
+
+    def block_stats(self):
+        with self.lock:
+            return {
+                "blocked_flows": len(self.blocked_flows),
+                "flows_with_rules": len(self._installed),
+                "offenses_tracked": len(self._offenses),
+                "installed": self.installed_blocks,
+                "redundant": self.redundant_blocks,
+                "rejected": self.rejected_blocks,
+            }
+
+    def unblock_flow(self, flow_id):
+        """Remove an automatic block before it expires."""
+        with self.lock:
+            if self._blocked_flows.pop(flow_id, None) is None:
+                return False
+            self.verdict_cache.discard(flow_id)
+            # Sblocco manuale: la storia del flusso riparte da zero
+            self._offenses.pop(flow_id, None)
+        self._delete_block_rules(flow_id)
+        return True
 
     def forward_packet(self, msg, datapath, in_port, actions, src, dst):
         parser = datapath.ofproto_parser
@@ -220,36 +597,167 @@ class Mitigator:
         )
         datapath.send_msg(out)
 
-    def add_flow(self, datapath, priority, match, actions):
+    def install_forwarding_flow(
+        self,
+        datapath,
+        in_port,
+        pkt,
+        actions,
+        idle_timeout=10,
+        hard_timeout=0,
+        send_flow_removed=False,
+    ):
+        """Install a forwarding entry for the flow of `pkt`.
+
+        The entry matches the flow's addresses, IP protocol and ports (see
+        _forwarding_match), so every new flow between the same two hosts
+        still reaches the controller, and should_block and the DoS checks.
+        It sits at FORWARD_PRIORITY, below the drop rules installed by
+        apply_block, so blocks keep taking precedence over forwarding. With
+        `send_flow_removed` the switch reports the entry's final counters
+        when it times out. Returns False when the frame is not matched
+        precisely enough to get an entry.
+        """
+        parser = datapath.ofproto_parser
+        match = self._forwarding_match(parser, in_port, pkt)
+        if match is None:
+            return False
+        flags = datapath.ofproto.OFPFF_SEND_FLOW_REM if send_flow_removed else 0
+        self.add_flow(
+            datapath,
+            FORWARD_PRIORITY,
+            match,
+            actions,
+            idle_timeout=idle_timeout,
+            hard_timeout=hard_timeout,
+            flags=flags,
+        )
+        return True
+
+    @staticmethod
+    def _forwarding_match(parser, in_port, pkt):
+        # Un flusso = MAC, indirizzi IP, protocollo e porte (tipo ICMP):
+        # una entry per coppia di MAC lascerebbe passare tutti i flussi
+        # successivi senza packet-in
+        eth = pkt["eth"]
+        match_kwargs = {
+            "in_port": in_port,
+            "eth_src": eth["src"],
+            "eth_dst": eth["dst"],
+        }
+        ip = pkt.get("ip")
+        if not ip:
+            if eth["ethertype"] == 0x8100:
+                return None  # VLAN senza IPv4: protocollo interno non noto
+            match_kwargs["eth_type"] = eth["ethertype"]  # es. ARP
+            return parser.OFPMatch(**match_kwargs)
+        match_kwargs["eth_type"] = 0x0800  # IPv4
+        match_kwargs["ipv4_src"] = ip["src"]
+        match_kwargs["ipv4_dst"] = ip["dst"]
+        match_kwargs["ip_proto"] = ip["proto"]
+        tcp = pkt.get("tcp")
+        udp = pkt.get("udp")
+        icmp = pkt.get("icmp")
+        if tcp:
+            match_kwargs["tcp_src"] = tcp["src_port"]
+            match_kwargs["tcp_dst"] = tcp["dst_port"]
+        elif udp:
+            match_kwargs["udp_src"] = udp["src_port"]
+            match_kwargs["udp_dst"] = udp["dst_port"]
+        elif icmp:
+            match_kwargs["icmpv4_type"] = icmp["type"]
+            match_kwargs["icmpv4_code"] = icmp["code"]
+        elif ip["proto"] in (1, 6, 17):
+            return None  # Header L4 non decodificato (es. frammento)
+        return parser.OFPMatch(**match_kwargs)
+
+    def add_flow(
+        self,
+        datapath,
+        priority,
+        match,
+        actions,
+        idle_timeout=0,
+        hard_timeout=0,
+        flags=0,
+        on_error=None,
+    ):
         parser = datapath.ofproto_parser
         ofproto = datapath.ofproto
         inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
         mod = parser.OFPFlowMod(
-            datapath=datapath, priority=priority, match=match, instructions=inst
+            datapath=datapath,
+            priority=priority,
+            match=match,
+            instructions=inst,
+            idle_timeout=idle_timeout,
+            hard_timeout=hard_timeout,
+            flags=flags,
         )
-        datapath.send_msg(mod)
-
-    def unblock_flows(self):
-        # Da chiamare periodicamente per sbloccare i flussi scaduti
-        now = time.time()
+        self.flow_mods.submit(datapath, mod, on_error=on_error)
 
-        # Unblock controller's automatic blocks
-        with self.lock:
-            expired = [
-                fid for fid, info in self.blocked_flows.items() if info["until"] <= now
-            ]
-            for fid in expired:
-                del self.blocked_flows[fid]
-                self.logger.info(f"Sblocco flow automatico: {fid}")
+    def delete_flow(self, datapath, priority, match):
+        # Rimuove la regola con esattamente questi match e priorita'
+        parser = datapath.ofproto_parser
+        ofproto = datapath.ofproto
+        mod = parser.OFPFlowMod(
+            datapath=datapath,
+            command=ofproto.OFPFC_DELETE_STRICT,
+            priority=priority,
+            match=match,
+            out_port=ofproto.OFPP_ANY,
+            out_group=ofproto.OFPG_ANY,
+        )
+        self.flow_mods.submit(datapath, mod)
+
+    def unblock_flows(self, now=None):
+        """Drop the blocks and shared entries that expired; return how many.
+
+        Only the expired entries are visited. The drop rules leave the
+        switches on their own through their hard_timeout.
+        """
+        now = time.time() if now is None else now
+        blocks, shared = [], []
+        for (kind, fid), until in self._expiry.pop_due(now):
+            (blocks if kind == "block" else shared).append((fid, until))
+
+        # Unblock controller's automatic blocks. Una scadenza diversa da
+        # quella attuale e' superata (il flusso e' stato ribloccato)
+        expired, released = [], []
+        if blocks:
+            with self.lock:
+                flows = self._blocked_flows
+                expired = [
+                    fid
+                    for fid, until in blocks
+                    if fid in flows and flows[fid]["until"] == until
+                ]
+                for fid in expired:
+                    del flows[fid]
+                    self.verdict_cache.discard(fid)
+                    released.append((fid, self._installed.pop(fid, ())))
+        for fid in expired:
+            self.hot_log.info("Sblocco flow automatico: %s", fid)
 
         # Unblock expired shared blocklist entries
-        with self.policy_lock:
-            expired_shared = [
-                fid
-                for fid, info in self.shared_blocklist.items()
-                if info["until"] <= now
-            ]
-            for fid in expired_shared:
-                source = self.shared_blocklist[fid].get("source", "unknown")
-                del self.shared_blocklist[fid]
-                self.logger.info(f"Sblocco flow condiviso: {fid} (source: {source})")
+        expired_shared = []
+        if shared:
+            with self.policy_lock:
+                entries = self._shared_blocklist
+                expired_shared = [
+                    (fid, entries[fid].get("source", "unknown"))
+                    for fid, until in shared
+                    if fid in entries and entries[fid]["until"] == until
+                ]
+                for fid, _ in expired_shared:
+                    del entries[fid]
+                    self.verdict_cache.discard(fid)
+            with self.lock:
+                for fid, _ in expired_shared:
+                    released.append((fid, self._installed.pop(fid, ())))
+        # Aggregati che coprivano i flussi scaduti: divisi o rimossi
+        for fid, rules in released:
+            self._release_block_rules(fid, rules)
+        for fid, source in expired_shared:
+            self.hot_log.info("Sblocco flow condiviso: %s (source: %s)", fid, source)
+        return len(expired) + len(expired_shared)
@@ -1,7 +1,38 @@
 import time
 import threading
+import struct
+from socket import inet_ntoa
 from ryu.lib import hub
+from ryu.lib.packet import packet, ethernet, vlan, ipv4, icmp, udp, tcp
 import logging  # <-- AGGIUNGI
+from collections import namedtuple
+from types import MappingProxyType
+from logging_utils import RateLimitedLogger
+from poll_scheduler import PollScheduler
+from stats_store import StatsStore, KIND_PORT, KIND_MAC, KIND_PROTOCOL
+
+# Layout degli header per il fast path di parse_packet
+_ETH_LEN = 14
+_VLAN_LEN = 4
+_IPV4_MIN_LEN = 20
+_TCP_MIN_LEN = 20
+_UDP_LEN = 8
+_ICMP_MIN_LEN = 4
+_ETH_TYPE_IP = 0x0800
+_ETH_TYPE_8021Q = 0x8100
+# IPv6 e tag VLAN annidati (QinQ) vanno al decoder completo
+_UNUSUAL_ETH_TYPES = frozenset((0x86DD, 0x8100, 0x88A8, 0x9100))
+
+_U16 = struct.Struct("!H")
+_VLAN = struct.Struct("!HH")
+_IPV4 = struct.Struct("!BxHxxHxB")
+_TCP = struct.Struct("!HH8xH")
+_PORTS = struct.Struct("!HH")
+_ICMP = struct.Struct("!BB")
+
+
+# Statistiche pubblicate: `stats` non cambia piu' dopo la pubblicazione
+StatsSnapshot = namedtuple("StatsSnapshot", ["version", "stats"])
 
 
 class Monitor:
@@ -9,88 +40,545 @@ class Monitor:
         self.controller = controller
         self.interval = interval
         self.running = True
-        self.stats = {
-            "ports": {},
-            "macs": {},
-            "protocols": {},
-        }
+        # Vista di sola lettura, sostituita (mai modificata) a ogni
+        # aggiornamento: i lettori non prendono il lock
+        self.stats = MappingProxyType(
+            {
+                "ports": MappingProxyType({}),
+                "macs": MappingProxyType({}),
+                "protocols": MappingProxyType({}),
+            }
+        )
+        self._snapshot = StatsSnapshot(0, self.stats)
+        # Tabelle macs/protocols dell'ultimo dump, meno i flussi rimossi:
+        # (kind, dpid) -> {chiave: [byte, pacchetti, rate, packet_rate, flussi]}
+        self._live = {}
+        # Contributo di ogni flusso del dump: dpid -> {flow_key: (chiavi, contatori, rate)}
+        self._live_flows = {}
+        # Ultimi rate dei flussi rimossi, pubblicati per `removed_hold`
+        # secondi e poi tolti: (kind, dpid) -> {chiave: [..., scadenza]}
+        self._removed = {}
+        self._changed = set()  # tabelle da ripubblicare al prossimo flush
+        self.removed_hold = interval
         self.lock = threading.Lock()
         self.logger = logging.getLogger("Monitor")  # <-- AGGIUNGI QUESTA RIGA
+        self.hot_log = RateLimitedLogger(self.logger, rate=1.0, burst=5)
+        self.parse_fallbacks = 0  # frame passati al decoder completo di Ryu
+        # Ultimi contatori per flusso (dpid, table, priority, cookie, match)
+        # o porta (dpid, "port", port_no)
+        # -> (byte_count, packet_count, duration, last_seen, rates)
+        self._flow_counters = {}
+        # Polling per switch con intervallo adattivo e jitter
+        self.scheduler = PollScheduler(interval=interval)
+        self.counter_ttl = 3 * self.scheduler.max_interval
+        # Accounting via FlowRemoved (vedi enable_flow_accounting)
+        self.flow_accounting = False
+        self.flow_poll_interval = None
+        self._last_flow_poll = {}
+        self.accounting = {"flows_removed": 0, "bytes": 0, "packets": 0}
+        # Una variazione dei rate di porta rende lo switch attivo (dump
+        # delle tabelle al ritmo normale): almeno del 50% e di 50 pkt/s
+        self.port_change_ratio = 0.5
+        self.port_change_floor = 50
+        # Storico colonnare (ring buffer NumPy) per porte, MAC e protocolli
+        self.store = StatsStore(history=64)
+        self._partial_replies = {}  # (kind, dpid) -> (xid, parti ricevute)
 
     def run(self):
         while self.running:
-            self.collect_stats()
-            time.sleep(self.interval)
+            now = time.time()
+            self.flush_removed()
+            self.collect_stats(now)
+            next_due = self.scheduler.next_due()
+            delay = self.interval if next_due is None else next_due - time.time()
+            time.sleep(min(max(delay, 0.05), self.interval))
 
     def stop(self):
         self.running = False
 
-    def collect_stats(self):
-        # Richiesta periodica delle statistiche agli switch
-        for dp in getattr(self.controller, "dps", {}).values():
-            parser = dp.ofproto_parser
-            req = parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY)
-            dp.send_msg(req)
-            req = parser.OFPFlowStatsRequest(dp)
+    def collect_stats(self, now=None):
+        # Richiesta delle statistiche agli switch il cui poll e' scaduto
+        now = time.time() if now is None else now
+        dps = getattr(self.controller, "dps", {})
+        self.scheduler.sync(list(dps), now)
+        for dpid in self.scheduler.due(now):
+            dp = dps.get(dpid)
+            if dp is not None:
+                self.poll_switch(dp, now)
+
+    def enable_flow_accounting(self, flow_poll_interval=60, removed_hold=None):
+        """Account flows from FlowRemoved events instead of table dumps.
+
+        Forwarding flows are then installed with timeouts and
+        OFPFF_SEND_FLOW_REM, so their final counters reach flow_removed()
+        without polling. The full flow table is only dumped every
+        `flow_poll_interval` seconds, to see long-lived flows, or at the
+        normal rate while the switch is marked active, as it is when its
+        port rates change. The final rate of a removed flow stays in the
+        stats for `removed_hold` seconds (one detector cycle).
+        """
+        self.flow_accounting = True
+        self.flow_poll_interval = flow_poll_interval
+        if removed_hold is not None:
+            self.removed_hold = removed_hold
+        self.counter_ttl = max(self.counter_ttl, 2 * flow_poll_interval)
+
+    def _flow_poll_due(self, dpid, now):
+        if not self.flow_accounting or self.scheduler.is_active(dpid, now):
+            return True
+        return now - self._last_flow_poll.get(dpid, 0) >= self.flow_poll_interval
+
+    def poll_switch(self, dp, now=None):
+        now = time.time() if now is None else now
+        parser = dp.ofproto_parser
+        requests = [("ports", parser.OFPPortStatsRequest(dp, 0, dp.ofproto.OFPP_ANY))]
+        if self._flow_poll_due(dp.id, now):
+            requests.append(("flows", parser.OFPFlowStatsRequest(dp)))
+            self._last_flow_poll[dp.id] = now
+        for kind, req in requests:
+            dp.set_xid(req)
+            self.scheduler.sent(dp.id, kind, req.xid, now)
             dp.send_msg(req)
 
+    def report_activity(self, dpid=None):
+        """Poll `dpid` (or every switch) faster after detector activity."""
+        self.scheduler.mark_active(dpid)
+
+    def polling_stats(self):
+        stats = {"switches": self.scheduler.stats()}
+        if self.flow_accounting:
+            with self.lock:
+                stats["flow_accounting"] = dict(
+                    self.accounting, flow_poll_interval=self.flow_poll_interval
+                )
+        return stats
+
+    def add_stats_reply(self, kind, dpid, xid, body, more):
+        """Collect one part of a multipart stats reply.
+
+        Large tables arrive as several replies with OFPMPF_REPLY_MORE set;
+        the parts are buffered per (kind, dpid) and the whole table is
+        processed once the last one arrives, so a partial reply never
+        replaces the stats of the full table.
+        """
+        with self.lock:
+            pending = self._partial_replies.get((kind, dpid))
+            if pending is None or pending[0] != xid:
+                # Nuova richiesta: le parti di una risposta precedente mai
+                # completata vengono scartate
+                pending = self._partial_replies[(kind, dpid)] = (xid, [])
+            pending[1].extend(body)
+            if more:
+                return
+            del self._partial_replies[(kind, dpid)]
+        latency = self.scheduler.replied(dpid, kind, xid)
+        if latency is not None:
+            self.hot_log.debug(
+                "%s stats reply from dpid %s in %.3fs", kind, dpid, latency
+            )
+        if kind == "flows":
+            self.update_flow_stats(dpid, pending[1])
+        else:
+            self.update_port_stats(dpid, pending[1])
+
     def update_port_stats(self, dpid, stats):
+        now = time.time()
+        samples = {}
+        changed = False
         with self.lock:
-            self.stats["ports"][dpid] = stats
+            self._publish({("ports", dpid): tuple(stats)})
+            for stat in stats:
+                port_no = getattr(stat, "port_no", 0)
+                byte_count = getattr(stat, "rx_bytes", 0) + getattr(stat, "tx_bytes", 0)
+                packet_count = getattr(stat, "rx_packets", 0) + getattr(
+                    stat, "tx_packets", 0
+                )
+                prev = self._flow_counters.get((dpid, "port", port_no))
+                byte_rate, packet_rate = self._counter_rates(
+                    (dpid, "port", port_no),
+                    byte_count,
+                    packet_count,
+                    self._duration(stat),
+                    now,
+                )
+                samples[port_no] = (byte_count, packet_count, byte_rate)
+                if prev is not None:
+                    delta = abs(packet_rate - prev[4][1])
+                    changed = changed or delta > max(
+                        self.port_change_floor, self.port_change_ratio * prev[4][1]
+                    )
+        self.store.record(KIND_PORT, dpid, samples, now)
+        if changed and self.flow_accounting:
+            # Traffico cambiato su una porta: le entry installate vanno
+            # rilette al ritmo normale, senza aspettare una rilevazione
+            self.scheduler.mark_active(dpid, now)
+
+    @staticmethod
+    def _duration(stat):
+        return (
+            getattr(stat, "duration_sec", 0) + getattr(stat, "duration_nsec", 0) / 1e9
+        )
+
+    def _counter_rates(self, counter_key, byte_count, packet_count, duration, now):
+        """Byte and packet rates of a flow or port since the previous poll.
+
+        Deltas are taken against the switch-side duration, so the poll
+        interval jitter does not skew the rate. A counter or duration going
+        backwards means the flow was reset or re-installed: the rate is then
+        computed from the new flow's own lifetime.
+        """
+        prev = self._flow_counters.get(counter_key)
+        if (
+            prev is None
+            or byte_count < prev[0]
+            or packet_count < prev[1]
+            or duration < prev[2]
+        ):
+            # Flusso nuovo o reinstallato: media sulla sua vita
+            elapsed = max(duration, 1.0)
+            rates = (byte_count / elapsed, packet_count / elapsed)
+        elif duration == prev[2]:
+            rates = prev[4]  # Risposta duplicata: nessun dato nuovo
+        else:
+            elapsed = duration - prev[2]
+            rates = (
+                (byte_count - prev[0]) / elapsed,
+                (packet_count - prev[1]) / elapsed,
+            )
+        self._flow_counters[counter_key] = (
+            byte_count,
+            packet_count,
+            duration,
+            now,
+            rates,
+        )
+        return rates
+
+    def _expire_flow_counters(self, now):
+        # Contatori di flussi non piu' riportati dagli switch
+        stale = [
+            key
+            for key, counters in self._flow_counters.items()
+            if now - counters[3] > self.counter_ttl
+        ]
+        for key in stale:
+            del self._flow_counters[key]
+
+    @staticmethod
+    def _flow_key(dpid, stat):
+        match = getattr(stat, "match", {})
+        items = match.items() if hasattr(match, "items") else ()
+        return (
+            dpid,
+            getattr(stat, "table_id", 0),
+            getattr(stat, "priority", 0),
+            getattr(stat, "cookie", 0),
+            tuple(sorted(items, key=lambda kv: kv[0])),
+        )
+
+    @staticmethod
+    def _stat_keys(match):
+        """Keys of a flow match in the macs and protocols tables (or None)."""
+        eth_src = match.get("eth_src")
+        eth_dst = match.get("eth_dst")
+        ipv4_src = match.get("ipv4_src")
+        ipv4_dst = match.get("ipv4_dst")
+        ip_proto = match.get("ip_proto")
+
+        # Statistiche per MAC
+        mac_key = f"{eth_src}_{eth_dst}" if eth_src else None
+
+        # Statistiche per protocollo
+        proto_key = None
+        if ip_proto:
+            if ip_proto == 6:  # TCP
+                proto_key = f"tcp_{ipv4_src}_{ipv4_dst}"
+            elif ip_proto == 17:  # UDP
+                proto_key = f"udp_{ipv4_src}_{ipv4_dst}"
+            else:
+                proto_key = f"ip_proto_{ip_proto}"
+        return mac_key, proto_key
 
     def update_flow_stats(self, dpid, stats):
+        """Replace the flow stats of `dpid` with a complete flow table."""
+        self.hot_log.info("Updating flow stats for dpid %s: %d flows", dpid, len(stats))
+        now = time.time()
+        macs = {}
+        protocols = {}
+        flows = {}
         with self.lock:
-            self.logger.info(f"Updating flow stats for dpid {dpid}: {len(stats)} flows")
-            # Inizializza strutture se non esistono
-            if dpid not in self.stats["macs"]:
-                self.stats["macs"][dpid] = {}
-            if dpid not in self.stats["protocols"]:
-                self.stats["protocols"][dpid] = {}
-
             # Aggiorna throughput per MAC, IP, protocollo
             for stat in stats:
                 match = getattr(stat, "match", {})
                 byte_count = getattr(stat, "byte_count", 0)
-                duration_sec = getattr(stat, "duration_sec", 1)
-                if duration_sec == 0:
-                    duration_sec = 1
-                throughput = byte_count / duration_sec
-
-                eth_src = match.get("eth_src")
-                eth_dst = match.get("eth_dst")
-                ipv4_src = match.get("ipv4_src")
-                ipv4_dst = match.get("ipv4_dst")
-                ip_proto = match.get("ip_proto")
-
-                # Aggiorna statistiche per MAC
-                if eth_src:
-                    key = f"{eth_src}_{eth_dst}"
-                    self.stats["macs"][dpid][key] = {"throughput": throughput}
-
-                # Aggiorna statistiche per protocollo
-                if ip_proto:
-                    if ip_proto == 6:  # TCP
-                        key = f"tcp_{ipv4_src}_{ipv4_dst}"
-                    elif ip_proto == 17:  # UDP
-                        key = f"udp_{ipv4_src}_{ipv4_dst}"
-                    else:
-                        key = f"ip_proto_{ip_proto}"
-                    self.stats["protocols"][dpid][key] = {"throughput": throughput}
+                packet_count = getattr(stat, "packet_count", 0)
+                flow_key = self._flow_key(dpid, stat)
+                rates = self._counter_rates(
+                    flow_key,
+                    byte_count,
+                    packet_count,
+                    self._duration(stat),
+                    now,
+                )
+                counts = (byte_count, packet_count)
+                keys = self._stat_keys(match)
+                if keys[0]:
+                    self._accumulate(macs, keys[0], counts, rates)
+                if keys[1]:
+                    self._accumulate(protocols, keys[1], counts, rates)
+                if any(keys):
+                    flows[flow_key] = (keys, counts, rates)
 
-    def get_stats(self):
+            # La tabella e' completa: i flussi spariti escono dalle stats
+            self._live[("macs", dpid)] = macs
+            self._live[("protocols", dpid)] = protocols
+            self._live_flows[dpid] = flows
+            self._publish(
+                {
+                    (kind, dpid): self._table((kind, dpid))
+                    for kind in ("macs", "protocols")
+                }
+            )
+            self._expire_flow_counters(now)
+            # Copie: flow_removed() aggiorna le tabelle live sotto lock
+            mac_samples = {k: v[:3] for k, v in macs.items()}
+            proto_samples = {k: v[:3] for k, v in protocols.items()}
+
+        self.store.record(KIND_MAC, dpid, mac_samples, now)
+        self.store.record(KIND_PROTOCOL, dpid, proto_samples, now)
+        self.store.expire(now - self.counter_ttl)
+
+    def flow_removed(self, dpid, msg):
+        """Account the final counters of a flow removed by the switch."""
+        now = time.time()
+        match = getattr(msg, "match", {})
+        byte_count = getattr(msg, "byte_count", 0)
+        packet_count = getattr(msg, "packet_count", 0)
         with self.lock:
-            return self.stats.copy()
+            flow_key = self._flow_key(dpid, msg)
+            byte_rate, packet_rate = self._counter_rates(
+                flow_key, byte_count, packet_count, self._duration(msg), now
+            )
+            self._flow_counters.pop(flow_key, None)
+            self.accounting["flows_removed"] += 1
+            self.accounting["bytes"] += byte_count
+            self.accounting["packets"] += packet_count
+            # Il flusso non e' piu' attivo: fuori dalle tabelle del dump
+            live = self._live_flows.get(dpid, {}).pop(flow_key, None)
+            samples = {}
+            for i, (kind, key) in enumerate(
+                zip(("macs", "protocols"), self._stat_keys(match))
+            ):
+                if not key:
+                    continue
+                if live is not None and live[0][i] == key:
+                    self._subtract(self._live.get((kind, dpid), {}), key, *live[1:])
+                # Pubblicate in blocco da flush_removed(), non per evento
+                removed = self._removed.setdefault((kind, dpid), {})
+                entry = removed.get(key)
+                if entry is None:
+                    removed[key] = [byte_count, packet_count, byte_rate, packet_rate]
+                else:
+                    entry[:4] = [
+                        entry[0] + byte_count,
+                        entry[1] + packet_count,
+                        entry[2] + byte_rate,
+                        entry[3] + packet_rate,
+                    ]
+                    del entry[4:]  # di nuovo in attesa di pubblicazione
+                self._changed.add((kind, dpid))
+                samples[kind] = {key: (byte_count, packet_count, byte_rate)}
+        if "macs" in samples:
+            self.store.record(KIND_MAC, dpid, samples["macs"], now)
+        if "protocols" in samples:
+            self.store.record(KIND_PROTOCOL, dpid, samples["protocols"], now)
+
+    @staticmethod
+    def _accumulate(table, key, counts, rates):
+        # Piu' flussi possono ricadere sulla stessa chiave: somma contatori e rate
+        entry = table.get(key)
+        if entry is None:
+            table[key] = [counts[0], counts[1], rates[0], rates[1], 1]
+        else:
+            entry[0] += counts[0]
+            entry[1] += counts[1]
+            entry[2] += rates[0]
+            entry[3] += rates[1]
+            entry[4] += 1
+
+    @staticmethod
+    def _subtract(table, key, counts, rates):
+        entry = table.get(key)
+        if entry is None:
+            return
+        entry[4] -= 1
+        if entry[4] <= 0:
+            del table[key]
+        else:
+            entry[0] -= counts[0]
+            entry[1] -= counts[1]
+            entry[2] = max(entry[2] - rates[0], 0.0)
+            entry[3] = max(entry[3] - rates[1], 0.0)
+
+    def _table(self, table_key):
+        """Read-only view of a macs/protocols table: live flows from the
+        last dump plus the removed flows being shown."""
+        table = {key: [v[2], v[3]] for key, v in self._live.get(table_key, {}).items()}
+        for key, entry in self._removed.get(table_key, {}).items():
+            if len(entry) > 4:  # gia' pubblicato, fino alla scadenza
+                rates = table.setdefault(key, [0.0, 0.0])
+                rates[0] += entry[2]
+                rates[1] += entry[3]
+        return MappingProxyType(
+            {
+                key: {"throughput": rates[0], "packet_rate": rates[1]}
+                for key, rates in table.items()
+            }
+        )
+
+    def _publish(self, tables):
+        """Publish a new stats snapshot replacing the given per-dpid tables.
+
+        `tables` maps (kind, dpid) to the new read-only table. Only the
+        touched levels are copied; everything else is shared with the
+        previous snapshot. Must be called with self.lock held.
+        """
+        stats = dict(self.stats)
+        for kind in {kind for kind, _ in tables}:
+            per_dpid = dict(stats[kind])
+            for (table_kind, dpid), table in tables.items():
+                if table_kind == kind:
+                    per_dpid[dpid] = table
+            stats[kind] = MappingProxyType(per_dpid)
+        self.stats = MappingProxyType(stats)
+        self._snapshot = StatsSnapshot(self._snapshot.version + 1, self.stats)
+
+    def flush_removed(self, now=None):
+        """Publish the flows reported by FlowRemoved since the last flush.
+
+        A removed flow's final rate is shown for `removed_hold` seconds,
+        then it leaves the tables.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            changed = self._changed
+            for table_key, removed in list(self._removed.items()):
+                for key, entry in list(removed.items()):
+                    if len(entry) == 4:
+                        entry.append(now + self.removed_hold)
+                    elif entry[4] <= now:
+                        del removed[key]
+                        changed.add(table_key)
+                if not removed:
+                    del self._removed[table_key]
+            if not changed:
+                return
+            self._publish({table_key: self._table(table_key) for table_key in changed})
+            self._changed = set()
+
+    def get_snapshot(self):
+        """Latest (version, stats) snapshot; lock-free and read-only.
+
+        The version grows with every published update, so a reader can
+        tell whether anything changed since its last snapshot.
+        """
+        return self._snapshot
+
+    def get_stats(self):
+        return self._snapshot.stats
 
     def parse_packet(self, data):
-        # Funzione di utilità per estrarre info da un pacchetto
-        from ryu.lib.packet import packet, ethernet, ipv4, udp, tcp
+        # Funzione di utilità per estrarre info da un pacchetto.
+        # Fast path: legge gli header a offset fissi senza costruire un
+        # ryu Packet; i frame insoliti passano al decoder completo di Ryu.
+        pkt = self._parse_packet_fast(data)
+        if pkt is None:
+            self.parse_fallbacks += 1
+            pkt = self._parse_packet_ryu(data)
+        return pkt
+
+    def _parse_packet_fast(self, data):
+        """Decode Ethernet/VLAN/IPv4/TCP/UDP/ICMP headers in place.
+
+        Returns None when the frame needs the full Ryu decoder (IPv6,
+        stacked VLAN tags, IP fragments, truncated headers).
+        """
+        buf = memoryview(data)
+        size = len(buf)
+        if size < _ETH_LEN:
+            return None
+
+        (ethertype,) = _U16.unpack_from(buf, 12)
+        eth = {
+            "src": buf[6:12].hex(":"),
+            "dst": buf[0:6].hex(":"),
+            "ethertype": ethertype,
+        }
+        pkt = {"eth": eth, "ip": None, "udp": None, "tcp": None}
+
+        offset = _ETH_LEN
+        l3_type = ethertype
+        if ethertype == _ETH_TYPE_8021Q:
+            if size < offset + _VLAN_LEN:
+                return None
+            tci, l3_type = _VLAN.unpack_from(buf, offset)
+            if l3_type in _UNUSUAL_ETH_TYPES:
+                return None
+            pkt["vlan"] = {"vid": tci & 0x0FFF, "pcp": tci >> 13}
+            offset += _VLAN_LEN
+        elif ethertype in _UNUSUAL_ETH_TYPES:
+            return None
+
+        if l3_type != _ETH_TYPE_IP:
+            return pkt
+
+        if size < offset + _IPV4_MIN_LEN:
+            return None
+        ver_ihl, total_length, frag, proto = _IPV4.unpack_from(buf, offset)
+        header_length = (ver_ihl & 0x0F) * 4
+        if ver_ihl >> 4 != 4 or header_length < _IPV4_MIN_LEN:
+            return None
+        if frag & 0x3FFF:  # MF bit o fragment offset
+            return None
+        pkt["ip"] = {
+            "src": inet_ntoa(buf[offset + 12 : offset + 16]),
+            "dst": inet_ntoa(buf[offset + 16 : offset + 20]),
+            "proto": proto,
+        }
+
+        l4 = offset + header_length
+        end = min(size, offset + total_length)
+        if proto == 6:
+            if end - l4 < _TCP_MIN_LEN:
+                return None
+            src_port, dst_port, flags = _TCP.unpack_from(buf, l4)
+            pkt["tcp"] = {
+                "src_port": src_port,
+                "dst_port": dst_port,
+                "flags": flags & 0x3F,
+            }
+        elif proto == 17:
+            if end - l4 < _UDP_LEN:
+                return None
+            src_port, dst_port = _PORTS.unpack_from(buf, l4)
+            pkt["udp"] = {"src_port": src_port, "dst_port": dst_port}
+        elif proto == 1:
+            if end - l4 < _ICMP_MIN_LEN:
+                return None
+            icmp_type, icmp_code = _ICMP.unpack_from(buf, l4)
+            pkt["icmp"] = {"type": icmp_type, "code": icmp_code}
+        return pkt
 
+    def _parse_packet_ryu(self, data):
+        # Decoder completo di Ryu, usato per i frame non gestiti dal fast path
         pkt = packet.Packet(data)
         eth = pkt.get_protocol(ethernet.ethernet)
+        vlan_hdr = pkt.get_protocol(vlan.vlan)
         ip = pkt.get_protocol(ipv4.ipv4)
         udp_pkt = pkt.get_protocol(udp.udp)
         tcp_pkt = pkt.get_protocol(tcp.tcp)
-        return {
+        icmp_pkt = pkt.get_protocol(icmp.icmp)
+        parsed = {
             "eth": {
                 "src": eth.src if eth else None,
                 "dst": eth.dst if eth else None,
@@ -117,8 +605,14 @@ class Monitor:
                 {
                     "src_port": tcp_pkt.src_port if tcp_pkt else None,
                     "dst_port": tcp_pkt.dst_port if tcp_pkt else None,
+                    "flags": tcp_pkt.bits & 0x3F if tcp_pkt else None,
                 }
                 if tcp_pkt
                 else None
             ),
         }
+        if vlan_hdr:
+            parsed["vlan"] = {"vid": vlan_hdr.vid, "pcp": vlan_hdr.pcp}
+        if icmp_pkt:
+            parsed["icmp"] = {"type": icmp_pkt.type, "code": icmp_pkt.code}
+        return parsed
@@ -0,0 +1,221 @@
+import logging
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Una riga per chiave (MAC o protocollo) dello snapshot delle statistiche.
+# key_id e' stabile tra i cicli, cosi' i plugin nei worker possono tenere
+# uno stato per chiave senza ricevere le stringhe delle chiavi.
+STATS_DTYPE = np.dtype(
+    [
+        ("key_id", "i8"),
+        ("kind", "i1"),
+        ("dpid", "u8"),
+        ("throughput", "f8"),
+        ("packet_rate", "f8"),
+        # Indirizzi sorgente/destinazione come interi (MAC a 48 bit o
+        # IPv4 a 32 bit), 0 se la chiave non li contiene
+        ("src", "u8"),
+        ("dst", "u8"),
+    ]
+)
+
+
+def rows_from_columns(columns):
+    """Build a private STATS_DTYPE array from a columns dict."""
+    rows = np.empty(len(columns["key_id"]), dtype=STATS_DTYPE)
+    for name, values in columns.items():
+        rows[name] = values
+    return rows
+
+
+# Processi avviati con spawn: il processo Ryu ha thread e green thread
+_mp = multiprocessing.get_context("spawn")
+
+
+class SharedStatsBuffer:
+    """Stats rows in a shared memory block, grown by doubling.
+
+    Workers attach to the block by name and read the rows in place, so a
+    cycle only sends (name, length) through the pipe instead of pickling
+    the stats.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = 0
+        self.shm = None
+        self.length = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.shm
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=max(capacity, 1) * STATS_DTYPE.itemsize
+        )
+        self.capacity = capacity
+        if old is not None:
+            old.close()
+            old.unlink()
+
+    @property
+    def rows(self):
+        return np.ndarray((self.length,), dtype=STATS_DTYPE, buffer=self.shm.buf)
+
+    def fill(self, columns):
+        """Write a cycle's rows: `columns` maps field name -> 1-D array."""
+        length = len(columns["key_id"])
+        if length > self.capacity:
+            capacity = self.capacity
+            while capacity < length:
+                capacity *= 2
+            self._allocate(capacity)
+        self.length = length
+        rows = self.rows
+        for name, values in columns.items():
+            rows[name] = values
+        return rows
+
+    def descriptor(self):
+        return (self.shm.name, self.length)
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+def _worker_main(plugin, conn):
+    """Worker loop: analyze the shared rows for every descriptor received."""
+    attached = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        name, length, now = message
+        shm = attached.get(name)
+        if shm is None:
+            for old in attached.values():
+                old.close()
+            attached.clear()
+            # Con spawn il worker condivide il resource tracker del
+            # detector, che resta l'unico a rimuovere il blocco
+            shm = attached[name] = shared_memory.SharedMemory(name=name)
+        rows = np.ndarray((length,), dtype=STATS_DTYPE, buffer=shm.buf)
+        try:
+            result = ("ok", plugin.analyze_rows(rows, now))
+        except Exception as exc:
+            result = ("error", repr(exc))
+        del rows  # nessuna vista deve sopravvivere alla chiusura del blocco
+        conn.send(result)
+    for shm in attached.values():
+        shm.close()
+
+
+class PluginWorker:
+    """One detection plugin running in its own process.
+
+    The plugin instance (and its state) lives in the worker. A call that
+    exceeds its timeout kills the worker and starts a fresh one from the
+    original plugin, so a stuck plugin never delays the next cycle.
+    """
+
+    def __init__(self, plugin, timeout=2.0):
+        self.plugin = plugin
+        self.name = type(plugin).__name__
+        self.timeout = timeout
+        self.logger = logging.getLogger("Detector")
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.restarts = 0
+        self.last_duration = None
+        self._sent_at = None
+        self._start()
+
+    def _start(self):
+        self._conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(
+            target=_worker_main,
+            args=(self.plugin, child_conn),
+            name=f"plugin-{self.name}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def _restart(self):
+        self.process.terminate()
+        self.process.join(1)
+        self._conn.close()
+        self.restarts += 1
+        self._start()
+
+    def submit(self, descriptor, now):
+        name, length = descriptor
+        if not self.process.is_alive():
+            self.errors += 1
+            self._restart()
+        try:
+            self._conn.send((name, length, now))
+        except (BrokenPipeError, OSError):
+            # Worker morto tra il controllo e l'invio: un solo tentativo
+            self.errors += 1
+            self._restart()
+            self._conn.send((name, length, now))
+        self._sent_at = time.monotonic()
+        self.calls += 1
+
+    def collect(self, deadline=None):
+        """Wait for the result of the last submit(); [] on timeout or error."""
+        if self._sent_at is None:
+            return []
+        if deadline is None:
+            deadline = self._sent_at + self.timeout
+        remaining = max(deadline - time.monotonic(), 0)
+        self._sent_at, sent_at = None, self._sent_at
+        try:
+            ready = self._conn.poll(remaining)
+            status, payload = self._conn.recv() if ready else (None, None)
+        except (EOFError, OSError):
+            ready, status, payload = True, "error", "worker exited"
+        self.last_duration = time.monotonic() - sent_at
+        if not ready:
+            self.timeouts += 1
+            self.logger.warning(
+                "Plugin %s timed out after %.1fs, restarting", self.name, self.timeout
+            )
+            self._restart()
+            return []
+        if status != "ok":
+            self.errors += 1
+            self.logger.warning("Plugin %s failed: %s", self.name, payload)
+            return []
+        return payload
+
+    def stop(self):
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._conn.close()
+
+    def stats(self):
+        return {
+            "plugin": self.name,
+            "pid": self.process.pid,
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "last_duration": self.last_duration,
+        }
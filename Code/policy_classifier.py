@@ -0,0 +1,334 @@
+import socket
+import struct
+
+# Campi confrontati per uguaglianza: nome nella policy -> (header, campo)
+EXACT_FIELDS = {
+    "eth_src": ("eth", "src"),
+    "eth_dst": ("eth", "dst"),
+    "ip_proto": ("ip", "proto"),
+    "udp_src": ("udp", "src_port"),
+    "udp_dst": ("udp", "dst_port"),
+    "tcp_src": ("tcp", "src_port"),
+    "tcp_dst": ("tcp", "dst_port"),
+}
+
+# Campi con match per prefisso (CIDR IPv4, prefissi MAC)
+IPV4_FIELDS = {
+    "ipv4_src": ("ip", "src"),
+    "ipv4_dst": ("ip", "dst"),
+}
+MAC_PATTERN_FIELDS = {
+    "eth_src_pattern": ("eth", "src"),
+    "eth_dst_pattern": ("eth", "dst"),
+}
+
+_IPV4_INT = struct.Struct("!I")
+
+
+def _ipv4_to_int(address):
+    return _IPV4_INT.unpack(socket.inet_aton(address))[0]
+
+
+def _packet_value(pkt, header, field):
+    hdr = pkt.get(header)
+    return hdr.get(field) if hdr else None
+
+
+def _mac_octets(mac):
+    return tuple(mac.lower().split(":"))
+
+
+def _check_string(name, value):
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid value for {name}: {value!r} is not a string")
+
+
+def compile_policy(policy):
+    """Turn a policy dict into a list of (name, kind, value) constraints.
+
+    Unknown keys (description, severity, ...) are ignored. Raises
+    ValueError for malformed addresses or prefixes and for values of the
+    wrong type (addresses are strings, protocol and ports integers).
+    """
+    if not isinstance(policy, dict):
+        raise ValueError(f"Policy must be an object, not {type(policy).__name__}")
+    constraints = []
+    for name, (header, field) in EXACT_FIELDS.items():
+        value = policy.get(name)
+        if value:
+            if name.startswith("eth_"):
+                _check_string(name, value)
+                value = value.lower()
+            else:
+                limit = 0xFF if name == "ip_proto" else 0xFFFF
+                if type(value) is not int or not 0 <= value <= limit:
+                    raise ValueError(f"Invalid value for {name}: {value!r}")
+            constraints.append((name, "exact", value))
+    for name in IPV4_FIELDS:
+        value = policy.get(name)
+        if not value:
+            continue
+        _check_string(name, value)
+        address, _, length = value.partition("/")
+        try:
+            prefix_len = int(length) if length else 32
+            network = _ipv4_to_int(address)
+        except (OSError, ValueError):
+            raise ValueError(f"Invalid IPv4 address or CIDR for {name}: {value}")
+        if not 0 <= prefix_len <= 32:
+            raise ValueError(f"Invalid prefix length for {name}: {value}")
+        if prefix_len == 32:
+            constraints.append(
+                (name, "exact", socket.inet_ntoa(_IPV4_INT.pack(network)))
+            )
+        else:
+            mask = (0xFFFFFFFF << (32 - prefix_len)) & 0xFFFFFFFF
+            constraints.append((name, "cidr", (network & mask, prefix_len)))
+    for name in MAC_PATTERN_FIELDS:
+        value = policy.get(name)
+        if not value:
+            continue
+        _check_string(name, value)
+        octets = tuple(o for o in _mac_octets(value) if o)
+        if len(octets) > 6 or any(len(o) != 2 for o in octets):
+            raise ValueError(f"Invalid MAC prefix for {name}: {value}")
+        try:
+            [int(o, 16) for o in octets]
+        except ValueError:
+            raise ValueError(f"Invalid MAC prefix for {name}: {value}")
+        constraints.append((name, "prefix", octets))
+    return constraints
+
+
+def _field_of(name):
+    return EXACT_FIELDS.get(name) or IPV4_FIELDS.get(name) or MAC_PATTERN_FIELDS[name]
+
+
+def constraints_match(constraints, pkt):
+    """Check a compiled policy against a parsed packet."""
+    for name, kind, value in constraints:
+        actual = _packet_value(pkt, *_field_of(name))
+        if actual is None:
+            return False
+        if kind == "exact":
+            if name.startswith("eth_"):
+                actual = actual.lower()
+            if actual != value:
+                return False
+        elif kind == "cidr":
+            network, prefix_len = value
+            if _ipv4_to_int(actual) >> (32 - prefix_len) != network >> (
+                32 - prefix_len
+            ):
+                return False
+        elif _mac_octets(actual)[: len(value)] != value:
+            return False
+    return True
+
+
+class _TrieNode:
+    __slots__ = ("children", "policies")
+
+    def __init__(self, children=None, policies=frozenset()):
+        self.children = children if children is not None else {}
+        self.policies = policies
+
+
+class PrefixTrie:
+    """Trie over symbol sequences (IPv4 bits or MAC octets).
+
+    Updates copy the nodes along the changed path instead of mutating
+    them, so a copy of the trie is O(1) and readers holding an older root
+    never see a half-applied change.
+    """
+
+    def __init__(self, root=None):
+        self.root = root if root is not None else _TrieNode()
+
+    def copy(self):
+        return PrefixTrie(self.root)
+
+    def insert(self, symbols, policy_id):
+        self.root = self._update(self.root, symbols, 0, policy_id, True)
+
+    def remove(self, symbols, policy_id):
+        root = self._update(self.root, symbols, 0, policy_id, False)
+        self.root = root if root is not None else _TrieNode()
+
+    def _update(self, node, symbols, depth, policy_id, insert):
+        if node is None:
+            if not insert:
+                return None
+            node = _TrieNode()
+        new = _TrieNode(dict(node.children), node.policies)
+        if depth == len(symbols):
+            if insert:
+                new.policies = new.policies | {policy_id}
+            else:
+                new.policies = new.policies - {policy_id}
+        else:
+            symbol = symbols[depth]
+            child = self._update(
+                node.children.get(symbol), symbols, depth + 1, policy_id, insert
+            )
+            if child is None:
+                new.children.pop(symbol, None)
+            else:
+                new.children[symbol] = child
+        # Pota i rami rimasti vuoti
+        if not new.policies and not new.children:
+            return None
+        return new
+
+    def walk(self, symbols):
+        """Yield the policy sets of every prefix of `symbols` in the trie."""
+        node = self.root
+        if node.policies:
+            yield node.policies
+        for symbol in symbols:
+            node = node.children.get(symbol)
+            if node is None:
+                return
+            if node.policies:
+                yield node.policies
+
+
+def _ipv4_bits(value, length=32):
+    return [(value >> (31 - i)) & 1 for i in range(length)]
+
+
+class PolicyClassifier:
+    """Indexed classifier for external blocking policies.
+
+    Each policy is filed under one anchor constraint: an exact field goes
+    into a hash index, a CIDR or MAC prefix into a trie, and policies with
+    no match fields into a wildcard set. A lookup only verifies the
+    policies reachable from the packet's own header values, so its cost
+    does not grow with the number of unrelated policies.
+
+    Writers (serialised by the caller) update the classifier in place and
+    match() can run concurrently without locking: policy-id sets are
+    frozensets and trie roots are replaced, never mutated, the index dicts
+    only see single-key updates, and a policy is indexed after it is
+    compiled and unindexed before it is dropped.
+    """
+
+    def __init__(self):
+        self._compiled = {}  # policy_id -> (constraints, anchor)
+        # name -> {value: frozenset(policy_id)}; tutti i campi creati subito,
+        # cosi' match() puo' iterare il dict mentre uno scrittore lo aggiorna
+        self._exact = {name: {} for name in (*EXACT_FIELDS, *IPV4_FIELDS)}
+        self._ipv4_tries = {name: PrefixTrie() for name in IPV4_FIELDS}
+        self._mac_tries = {name: PrefixTrie() for name in MAC_PATTERN_FIELDS}
+        self._wildcard = frozenset()
+
+    def __len__(self):
+        return len(self._compiled)
+
+    def __contains__(self, policy_id):
+        return policy_id in self._compiled
+
+    @staticmethod
+    def _choose_anchor(constraints):
+        exact = [c for c in constraints if c[1] == "exact"]
+        if exact:
+            # Le porte e ip_proto sono poco selettive: preferisci indirizzi
+            exact.sort(
+                key=lambda c: c[0]
+                in ("ip_proto", "udp_src", "udp_dst", "tcp_src", "tcp_dst")
+            )
+            return exact[0]
+        prefixes = [c for c in constraints if c[1] != "exact"]
+        if prefixes:
+            return max(
+                prefixes, key=lambda c: len(c[2]) if c[1] == "prefix" else c[2][1]
+            )
+        return None
+
+    def _index(self, policy_id, anchor, insert):
+        if anchor is None:
+            if insert:
+                self._wildcard = self._wildcard | {policy_id}
+            else:
+                self._wildcard = self._wildcard - {policy_id}
+            return
+        name, kind, value = anchor
+        if kind == "exact":
+            bucket = self._exact[name]
+            ids = bucket.get(value, frozenset())
+            ids = ids | {policy_id} if insert else ids - {policy_id}
+            if ids:
+                bucket[value] = ids
+            else:
+                bucket.pop(value, None)
+        elif kind == "cidr":
+            network, prefix_len = value
+            symbols = _ipv4_bits(network, prefix_len)
+            trie = self._ipv4_tries[name]
+            (trie.insert if insert else trie.remove)(symbols, policy_id)
+        else:
+            trie = self._mac_tries[name]
+            (trie.insert if insert else trie.remove)(value, policy_id)
+
+    def add(self, policy_id, policy):
+        """Compile and index a policy, replacing any previous one with the same id."""
+        self.update({policy_id: policy})
+
+    def update(self, policies):
+        """Add several policies; raises ValueError, adding none, if one is malformed."""
+        compiled = [
+            (policy_id, compile_policy(policy))
+            for policy_id, policy in policies.items()
+        ]
+        for policy_id, constraints in compiled:
+            anchor = self._choose_anchor(constraints)
+            previous = self._compiled.get(policy_id)
+            self._compiled[policy_id] = (constraints, anchor)
+            self._index(policy_id, anchor, insert=True)
+            # La vecchia ancora si toglie dopo: la policy resta sempre visibile
+            if previous is not None and previous[1] != anchor:
+                self._index(policy_id, previous[1], insert=False)
+
+    def remove(self, policy_id):
+        entry = self._compiled.get(policy_id)
+        if entry is None:
+            return False
+        self._index(policy_id, entry[1], insert=False)
+        del self._compiled[policy_id]
+        return True
+
+    def _candidates(self, pkt):
+        if self._wildcard:
+            yield self._wildcard
+        for name, bucket in self._exact.items():
+            if not bucket:
+                continue
+            value = _packet_value(pkt, *EXACT_FIELDS.get(name) or IPV4_FIELDS[name])
+            if value is None:
+                continue
+            if name.startswith("eth_"):
+                value = value.lower()
+            ids = bucket.get(value)
+            if ids:
+                yield ids
+        # Un prefisso /0 sta sulla radice, senza figli
+        for name, trie in self._ipv4_tries.items():
+            if trie.root.children or trie.root.policies:
+                value = _packet_value(pkt, *IPV4_FIELDS[name])
+                if value is not None:
+                    yield from trie.walk(_ipv4_bits(_ipv4_to_int(value)))
+        for name, trie in self._mac_tries.items():
+            if trie.root.children or trie.root.policies:
+                value = _packet_value(pkt, *MAC_PATTERN_FIELDS[name])
+                if value is not None:
+                    yield from trie.walk(_mac_octets(value))
+
+    def match(self, pkt):
+        """Return the id of a policy matching the packet, or None."""
+        compiled = self._compiled
+        for ids in self._candidates(pkt):
+            for policy_id in ids:
+                entry = compiled.get(policy_id)  # None se rimossa nel frattempo
+                if entry is not None and constraints_match(entry[0], pkt):
+                    return policy_id
+        return None
@@ -0,0 +1,184 @@
+import heapq
+import random
+import threading
+import time
+
+
+class _SwitchPolls:
+    __slots__ = (
+        "interval",
+        "next_due",
+        "outstanding",
+        "active_until",
+        "latency",
+        "polls",
+        "replies",
+        "skipped",
+        "timeouts",
+    )
+
+    def __init__(self, interval, next_due):
+        self.interval = interval
+        self.next_due = next_due
+        self.outstanding = {}  # kind -> (xid, sent_at)
+        self.active_until = 0.0
+        self.latency = None  # media mobile esponenziale, secondi
+        self.polls = 0
+        self.replies = 0
+        self.skipped = 0
+        self.timeouts = 0
+
+
+class PollScheduler:
+    """Per-switch stats polling schedule with jitter and adaptive intervals.
+
+    Each switch has its own interval between `min_interval` and
+    `max_interval`: it drops to `min_interval` while the switch is marked
+    active and grows by `backoff` at every quiet poll. Due times carry
+    +/- `jitter` so switches never settle into synchronized polls, and the
+    first poll of a new switch is spread over one base interval.
+
+    Requests are tracked until their last reply part arrives. A switch
+    whose previous reply is still pending is skipped for that round; a
+    request unanswered for `reply_timeout` seconds is given up.
+    """
+
+    def __init__(
+        self,
+        interval=2,
+        min_interval=1,
+        max_interval=16,
+        backoff=1.5,
+        jitter=0.2,
+        active_hold=30,
+        reply_timeout=10,
+    ):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.active_hold = active_hold
+        self.reply_timeout = reply_timeout
+        self.lock = threading.Lock()
+        self._switches = {}
+        self._heap = []  # (next_due, dpid)
+
+    def _schedule(self, dpid, state, now, delay):
+        delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        state.next_due = now + delay
+        heapq.heappush(self._heap, (state.next_due, dpid))
+
+    def sync(self, dpids, now=None):
+        """Follow the set of connected switches."""
+        now = time.time() if now is None else now
+        with self.lock:
+            for dpid in dpids:
+                if dpid not in self._switches:
+                    state = self._switches[dpid] = _SwitchPolls(self.interval, now)
+                    state.next_due = now + random.uniform(0, self.interval)
+                    heapq.heappush(self._heap, (state.next_due, dpid))
+            for dpid in set(self._switches) - set(dpids):
+                del self._switches[dpid]  # le voci nello heap vengono ignorate
+
+    def due(self, now=None):
+        """Pop the switches due for a poll.
+
+        Returns the dpids to poll now; switches with a reply still pending
+        are rescheduled without being returned.
+        """
+        now = time.time() if now is None else now
+        ready = []
+        with self.lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                due_at, dpid = heapq.heappop(heap)
+                state = self._switches.get(dpid)
+                if state is None or state.next_due != due_at:
+                    continue  # switch rimosso o voce superata
+                for kind, (xid, sent_at) in list(state.outstanding.items()):
+                    if now - sent_at > self.reply_timeout:
+                        del state.outstanding[kind]
+                        state.timeouts += 1
+                if state.outstanding:
+                    state.skipped += 1
+                else:
+                    ready.append(dpid)
+                    state.polls += 1
+                    if now >= state.active_until:
+                        state.interval = min(
+                            state.interval * self.backoff, self.max_interval
+                        )
+                self._schedule(dpid, state, now, state.interval)
+        return ready
+
+    def next_due(self):
+        """Earliest due time, or None with no switch to poll."""
+        with self.lock:
+            return self._heap[0][0] if self._heap else None
+
+    def sent(self, dpid, kind, xid, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self._switches.get(dpid)
+            if state is not None:
+                state.outstanding[kind] = (xid, now)
+
+    def replied(self, dpid, kind, xid, now=None):
+        """Record the last part of a reply; return its latency or None."""
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self._switches.get(dpid)
+            if state is None:
+                return None
+            pending = state.outstanding.get(kind)
+            if pending is None or pending[0] != xid:
+                return None
+            del state.outstanding[kind]
+            state.replies += 1
+            latency = now - pending[1]
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency += 0.2 * (latency - state.latency)
+            return latency
+
+    def mark_active(self, dpid=None, now=None):
+        """Poll `dpid` (or every switch) at the fastest rate for a while."""
+        now = time.time() if now is None else now
+        with self.lock:
+            dpids = self._switches if dpid is None else [dpid]
+            for key in dpids:
+                state = self._switches.get(key)
+                if state is None:
+                    continue
+                state.active_until = now + self.active_hold
+                if state.interval > self.min_interval:
+                    state.interval = self.min_interval
+                    # Anticipa il prossimo poll se era lontano
+                    if state.next_due > now + self.min_interval:
+                        self._schedule(key, state, now, self.min_interval)
+
+    def is_active(self, dpid, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            state = self._switches.get(dpid)
+            return state is not None and now < state.active_until
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            return {
+                str(dpid): {
+                    "interval": state.interval,
+                    "next_poll_in": max(state.next_due - now, 0.0),
+                    "active": now < state.active_until,
+                    "outstanding": sorted(state.outstanding),
+                    "reply_latency": state.latency,
+                    "polls": state.polls,
+                    "replies": state.replies,
+                    "skipped": state.skipped,
+                    "timeouts": state.timeouts,
+                }
+                for dpid, state in self._switches.items()
+            }
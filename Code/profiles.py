@@ -0,0 +1,313 @@
+import time
+from collections import OrderedDict, deque
+
+from sketches import HyperLogLog
+
+
+class HostProfile:
+    """Per-host traffic profile with fixed-size, time-bucketed counters.
+
+    The sliding window is split into one-second buckets stored in ring
+    arrays, with running totals kept alongside, so recording a packet and
+    reading the window rate or SYN/ICMP/UDP counts are constant-time
+    operations with constant memory.
+
+    Connection attempts (TCP SYNs, ICMP echo requests) feed two
+    HyperLogLog sketches counting the distinct hosts and ports probed, so
+    host sweeps and port scans are measured in a few hundred bytes per
+    source however many addresses are touched. The sketches start over
+    every `window` seconds.
+    """
+
+    __slots__ = (
+        "first_seen",
+        "last_update",
+        "window",
+        "block_count",
+        "rate_history",
+        "probed_hosts",
+        "probed_ports",
+        "_probe_epoch",
+        "_head",
+        "_packets",
+        "_syn",
+        "_icmp",
+        "_udp",
+        "packet_count",
+        "syn_count",
+        "ping_count",
+        "udp_count",
+    )
+
+    def __init__(self, now, window=20, rate_samples=5, sketch_precision=7):
+        self.first_seen = now
+        self.last_update = now
+        self.window = window
+        self.block_count = 0
+        self.rate_history = deque(maxlen=rate_samples)
+        self.probed_hosts = HyperLogLog(sketch_precision)
+        self.probed_ports = HyperLogLog(sketch_precision)
+        self._probe_epoch = now
+        self._head = int(now)
+        self._packets = [0] * window
+        self._syn = [0] * window
+        self._icmp = [0] * window
+        self._udp = [0] * window
+        # Totali sulla finestra corrente
+        self.packet_count = 0
+        self.syn_count = 0
+        self.ping_count = 0
+        self.udp_count = 0
+
+    def _advance(self, now):
+        """Expire the buckets that fell out of the window since the last call."""
+        second = int(now)
+        steps = second - self._head
+        if steps <= 0:
+            return
+        window = self.window
+        for offset in range(1, min(steps, window) + 1):
+            slot = (self._head + offset) % window
+            self.packet_count -= self._packets[slot]
+            self.syn_count -= self._syn[slot]
+            self.ping_count -= self._icmp[slot]
+            self.udp_count -= self._udp[slot]
+            self._packets[slot] = 0
+            self._syn[slot] = 0
+            self._icmp[slot] = 0
+            self._udp[slot] = 0
+        self._head = second
+
+    def record(self, now, syn=False, icmp=False, udp=False):
+        """Account one packet sent at `now`."""
+        self._advance(now)
+        self.last_update = now
+        slot = self._head % self.window
+        self._packets[slot] += 1
+        self.packet_count += 1
+        if syn:
+            self._syn[slot] += 1
+            self.syn_count += 1
+        elif icmp:
+            self._icmp[slot] += 1
+            self.ping_count += 1
+        elif udp:
+            self._udp[slot] += 1
+            self.udp_count += 1
+
+    def record_probe(self, now, host, port=None):
+        """Account a connection attempt to `host` (and `port`, for TCP)."""
+        if now - self._probe_epoch >= self.window:
+            self.probed_hosts.clear()
+            self.probed_ports.clear()
+            self._probe_epoch = now
+        self.probed_hosts.add(host)
+        if port is not None:
+            self.probed_ports.add(port)
+
+    def rate(self, now):
+        """Packets/s over the sliding window (shorter for young profiles)."""
+        time_window = min(self.window, now - self.first_seen)
+        if time_window <= 0:
+            return 0.0
+        return self.packet_count / time_window
+
+    def reset_window(self):
+        """Forget the packets in the current window (called after a block)."""
+        for counters in (self._packets, self._syn, self._icmp, self._udp):
+            for slot in range(self.window):
+                counters[slot] = 0
+        self.packet_count = 0
+        self.syn_count = 0
+        self.ping_count = 0
+        self.udp_count = 0
+        self.probed_hosts.clear()
+        self.probed_ports.clear()
+
+
+class HostProfileTable:
+    """Host profiles kept in last-update order for O(1) TTL expiry.
+
+    Every touch moves the profile to the tail, so idle hosts accumulate at
+    the head and the cleanup only visits the profiles that actually expire.
+    With `max_profiles` set, the least recently updated profile is evicted
+    to make room for a new one.
+    """
+
+    def __init__(self, ttl=30, window=20, max_profiles=None):
+        self.ttl = ttl
+        self.window = window
+        self.max_profiles = max_profiles
+        self.evicted = 0
+        self._profiles = OrderedDict()
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __contains__(self, host):
+        return host in self._profiles
+
+    def get(self, host):
+        return self._profiles.get(host)
+
+    def touch(self, host, now):
+        """Return the profile for `host`, creating it if needed."""
+        profile = self._profiles.get(host)
+        if profile is None:
+            if self.max_profiles and len(self._profiles) >= self.max_profiles:
+                self._profiles.popitem(last=False)
+                self.evicted += 1
+            profile = HostProfile(now, window=self.window)
+            self._profiles[host] = profile
+        else:
+            self._profiles.move_to_end(host)
+        return profile
+
+    def discard(self, host):
+        self._profiles.pop(host, None)
+
+    def expire(self, now=None):
+        """Drop profiles idle for more than `ttl` seconds; return how many."""
+        now = time.time() if now is None else now
+        expired = 0
+        while self._profiles:
+            host, profile = next(iter(self._profiles.items()))
+            if now - profile.last_update <= self.ttl:
+                break
+            del self._profiles[host]
+            expired += 1
+        return expired
+
+    def items(self):
+        return self._profiles.items()
+
+
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+
+class _HandshakeCounters:
+    __slots__ = ("last_update", "flagged_until", "head", "buckets", "totals")
+
+    def __init__(self, now, window):
+        self.last_update = now
+        self.flagged_until = 0.0
+        self.head = int(now)
+        self.buckets = [[0, 0, 0] for _ in range(window)]  # syn, syn-ack, ack
+        self.totals = [0, 0, 0]
+
+
+class HandshakeTracker:
+    """Per-destination TCP handshake counters with fixed memory.
+
+    For every server it counts, over a sliding window of one-second
+    buckets, the SYNs it receives, the SYN-ACKs it sends and the ACKs that
+    complete a handshake towards it. A server receiving at least
+    `min_syns` SYNs that outnumber the ACKs by `ratio` is under a SYN
+    flood, whatever the number of sources: spoofed floods where each
+    source sends only a few SYNs are caught as well. At most
+    `max_destinations` servers are tracked, the least recently seen one
+    is evicted first.
+    """
+
+    SYN, SYN_ACK, ACK = range(3)
+
+    def __init__(
+        self, window=10, min_syns=50, ratio=3.0, max_destinations=1024, hold=10
+    ):
+        self.window = window
+        self.min_syns = min_syns
+        self.ratio = ratio
+        self.max_destinations = max_destinations
+        self.hold = hold  # secondi prima di segnalare di nuovo lo stesso server
+        self.evicted = 0
+        self._servers = OrderedDict()
+
+    def __len__(self):
+        return len(self._servers)
+
+    @staticmethod
+    def classify(flags):
+        """Counter index of a TCP segment with `flags`, or None."""
+        if flags is None or flags & TCP_RST:
+            return None
+        syn_ack = flags & (TCP_SYN | TCP_ACK)
+        if syn_ack == TCP_SYN:
+            return HandshakeTracker.SYN
+        if syn_ack == TCP_SYN | TCP_ACK:
+            return HandshakeTracker.SYN_ACK
+        if syn_ack == TCP_ACK:
+            return HandshakeTracker.ACK
+        return None
+
+    def _advance(self, counters, now):
+        second = int(now)
+        steps = second - counters.head
+        if steps <= 0:
+            return
+        window = self.window
+        totals = counters.totals
+        for offset in range(1, min(steps, window) + 1):
+            bucket = counters.buckets[(counters.head + offset) % window]
+            for i in range(3):
+                totals[i] -= bucket[i]
+                bucket[i] = 0
+        counters.head = second
+
+    def record(self, src, dst, flags, now):
+        """Account one TCP segment from `src` to `dst` (IP addresses).
+
+        Returns (server, syn, syn_ack, ack) the first time a server is
+        found under a SYN flood (then again every `hold` seconds while it
+        lasts), otherwise None.
+        """
+        counter = self.classify(flags)
+        if counter is None:
+            return None
+        # Il SYN-ACK parte dal server, SYN e ACK sono diretti al server
+        server = src if counter == self.SYN_ACK else dst
+        servers = self._servers
+        counters = servers.get(server)
+        if counter == self.ACK and counters is None:
+            return None  # nessun SYN visto: non crea stato per ogni ACK
+        if counters is None:
+            if len(servers) >= self.max_destinations:
+                servers.popitem(last=False)
+                self.evicted += 1
+            counters = servers[server] = _HandshakeCounters(now, self.window)
+        else:
+            servers.move_to_end(server)
+        self._advance(counters, now)
+        counters.last_update = now
+        counters.buckets[counters.head % self.window][counter] += 1
+        counters.totals[counter] += 1
+
+        if counter != self.SYN or now < counters.flagged_until:
+            return None
+        syn, syn_ack, ack = counters.totals
+        if syn >= self.min_syns and syn > self.ratio * ack:
+            counters.flagged_until = now + self.hold
+            return server, syn, syn_ack, ack
+        return None
+
+    def expire(self, now=None):
+        """Drop servers idle for a whole window; return how many."""
+        now = time.time() if now is None else now
+        expired = 0
+        while self._servers:
+            server, counters = next(iter(self._servers.items()))
+            if now - counters.last_update <= self.window:
+                break
+            del self._servers[server]
+            expired += 1
+        return expired
+
+    def half_open(self, now=None):
+        """{server: (syn, syn_ack, ack)} over the window, for reporting."""
+        now = time.time() if now is None else now
+        result = {}
+        for server, counters in self._servers.items():
+            self._advance(counters, now)
+            result[server] = tuple(counters.totals)
+        return result
@@ -0,0 +1,294 @@
+import threading
+import time
+from collections import deque
+
+# Operazioni restituite al mitigator, che le traduce in flow mod
+ADD_EXACT = "add_exact"
+DELETE_EXACT = "delete_exact"
+ADD_AGGREGATE = "add_aggregate"
+DELETE_AGGREGATE = "delete_aggregate"
+
+
+def aggregate_keys(flow_id, in_port):
+    """Wildcard rules that could cover `flow_id` on port `in_port`.
+
+    Keys are ("eth_src", in_port, mac), ("ipv4_src", in_port, "a.b.c.0/24")
+    and ("udp_dst", in_port, ipv4_dst, port).
+    """
+    # Un aggregato con lo stesso match della regola esatta non la sostituisce
+    keys = []
+    if flow_id[0] and any(flow_id[1:]):
+        keys.append(("eth_src", in_port, flow_id[0]))
+    if flow_id[2]:
+        prefix = flow_id[2].rsplit(".", 1)[0]
+        keys.append(("ipv4_src", in_port, f"{prefix}.0/24"))
+    if flow_id[3] and flow_id[5] and any(flow_id[i] for i in (0, 1, 2, 4)):
+        keys.append(("udp_dst", in_port, flow_id[3], flow_id[5]))
+    return keys
+
+
+class _Aggregate:
+    __slots__ = ("members", "until", "created")
+
+    def __init__(self, members, until, created):
+        self.members = members  # flow_id -> (in_port, scadenza)
+        self.until = until
+        self.created = created
+
+
+class _SwitchRules:
+    __slots__ = ("exact", "aggregates", "covered", "groups", "stalled")
+
+    def __init__(self):
+        self.exact = {}  # flow_id -> (in_port, scadenza)
+        self.aggregates = {}  # chiave -> _Aggregate
+        self.covered = {}  # flow_id -> chiave dell'aggregato
+        # Gruppi delle regole esatte, aggiornati a ogni modifica di exact
+        self.groups = {}  # chiave -> {flow_id: None}
+        # Oltre il budget senza gruppi abbastanza grandi da compattare
+        self.stalled = False
+
+    def __len__(self):
+        return len(self.exact) + len(self.aggregates)
+
+    def add_exact(self, flow_id, in_port, until):
+        self.pop_exact(flow_id)
+        self.exact[flow_id] = (in_port, until)
+        for key in aggregate_keys(flow_id, in_port):
+            self.groups.setdefault(key, {})[flow_id] = None
+
+    def pop_exact(self, flow_id):
+        rule = self.exact.pop(flow_id, None)
+        if rule is not None:
+            for key in aggregate_keys(flow_id, rule[0]):
+                group = self.groups[key]
+                del group[flow_id]
+                if not group:
+                    del self.groups[key]
+        return rule
+
+
+class RuleCompactor:
+    """Per-switch drop-rule budget with wildcard aggregation.
+
+    Drop rules are exact per flow until a switch holds `budget` of them.
+    Past that, the largest group of at least `min_group` exact rules
+    sharing a source MAC, a source /24 or a destination UDP port (on the
+    same in_port) is replaced by one wildcard rule covering them. A new
+    block already covered by an aggregate adds no rule. When members
+    expire, an aggregate is split back into exact rules as soon as they
+    fit in `split_ratio` of the budget, so the wider match, and the
+    legitimate traffic it catches, lasts only as long as needed. A switch
+    over budget with no group to compact counts as one over_budget
+    episode, and is examined again only when a new rule grows one of its
+    groups to `min_group`.
+
+    Methods return the rule operations to perform, as tuples
+    (ADD_EXACT, flow_id, in_port, until), (DELETE_EXACT, flow_id,
+    in_port), (ADD_AGGREGATE, key, until) and (DELETE_AGGREGATE, key).
+    """
+
+    def __init__(self, budget=1000, min_group=4, split_ratio=0.8):
+        self.budget = budget
+        self.min_group = min_group
+        self.split_ratio = split_ratio
+        self.lock = threading.Lock()
+        self._switches = {}  # dpid -> _SwitchRules
+        self.compactions = 0
+        self.splits = 0
+        self.over_budget = 0
+        self.rejected = 0
+        self.decisions = deque(maxlen=32)
+
+    def _decide(self, action, dpid, key, members, now):
+        self.decisions.append(
+            {
+                "action": action,
+                "dpid": dpid,
+                "rule": list(key),
+                "members": members,
+                "time": now,
+            }
+        )
+
+    def admit(self, dpid, flow_id, in_port, until, now=None):
+        """A drop for `flow_id` is needed on `dpid` until `until`."""
+        now = time.time() if now is None else now
+        with self.lock:
+            table = self._switches.setdefault(dpid, _SwitchRules())
+            for key in aggregate_keys(flow_id, in_port):
+                aggregate = table.aggregates.get(key)
+                if aggregate is None or aggregate.until <= now:
+                    continue
+                # Gia' coperto: al piu' si allunga la durata dell'aggregato
+                aggregate.members[flow_id] = (in_port, until)
+                table.covered[flow_id] = key
+                if until > aggregate.until:
+                    aggregate.until = until
+                    return [(ADD_AGGREGATE, key, until)]
+                return []
+            table.add_exact(flow_id, in_port, until)
+            ops = [(ADD_EXACT, flow_id, in_port, until)]
+            if len(table) <= self.budget:
+                table.stalled = False
+            elif not table.stalled or any(
+                len(table.groups[key]) >= self.min_group
+                for key in aggregate_keys(flow_id, in_port)
+            ):
+                # In stallo solo un gruppo della nuova regola puo' essere
+                # diventato compattabile: gli altri non sono cresciuti
+                ops.extend(self._compact(dpid, table, now))
+            return ops
+
+    def _purge(self, table, now):
+        # Regole gia' scadute sullo switch (hard_timeout)
+        for flow_id, (_, until) in list(table.exact.items()):
+            if until <= now:
+                table.pop_exact(flow_id)
+        for key, aggregate in list(table.aggregates.items()):
+            if aggregate.until <= now:
+                del table.aggregates[key]
+                for flow_id in aggregate.members:
+                    table.covered.pop(flow_id, None)
+
+    def _compact(self, dpid, table, now):
+        self._purge(table, now)
+        ops = []
+        while len(table) > self.budget:
+            if not table.groups:
+                table.stalled = True
+                break
+            key, group = max(table.groups.items(), key=lambda item: len(item[1]))
+            if len(group) < self.min_group:
+                # Una sola decisione per episodio, non una per regola
+                if not table.stalled:
+                    table.stalled = True
+                    self.over_budget += 1
+                    self._decide("over_budget", dpid, key, len(table), now)
+                break
+            flow_ids = list(group)
+            members = {flow_id: table.pop_exact(flow_id) for flow_id in flow_ids}
+            until = max(member_until for _, member_until in members.values())
+            table.aggregates[key] = _Aggregate(members, until, now)
+            for flow_id in flow_ids:
+                table.covered[flow_id] = key
+            # Prima l'aggregato, poi la rimozione delle regole esatte
+            ops.append((ADD_AGGREGATE, key, until))
+            ops.extend(
+                (DELETE_EXACT, flow_id, in_port)
+                for flow_id, (in_port, _) in members.items()
+            )
+            self.compactions += 1
+            self._decide("compact", dpid, key, len(members), now)
+        else:
+            table.stalled = False
+        return ops
+
+    def release(self, dpid, flow_id, now=None, force=False):
+        """The drop for `flow_id` on `dpid` is no longer needed.
+
+        An expired exact rule leaves the switch through its hard_timeout;
+        with `force` (manual unblock) it is deleted, and an aggregate
+        covering the flow is split at once whatever the budget.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            table = self._switches.get(dpid)
+            if table is None:
+                return []
+            exact = table.pop_exact(flow_id)
+            if exact is not None:
+                return [(DELETE_EXACT, flow_id, exact[0])] if force else []
+            key = table.covered.pop(flow_id, None)
+            aggregate = table.aggregates.get(key)
+            if aggregate is None:
+                return []
+            aggregate.members.pop(flow_id, None)
+            members = {
+                fid: member
+                for fid, member in aggregate.members.items()
+                if member[1] > now
+            }
+            if not members:
+                del table.aggregates[key]
+                self._decide("remove", dpid, key, 0, now)
+                return [(DELETE_AGGREGATE, key)]
+            if not force and len(table) - 1 + len(members) > (
+                self.budget * self.split_ratio
+            ):
+                return []
+            # Split: regole esatte per i membri rimasti, poi via l'aggregato
+            del table.aggregates[key]
+            ops = []
+            for fid, (in_port, until) in members.items():
+                table.covered.pop(fid, None)
+                table.add_exact(fid, in_port, until)
+                ops.append((ADD_EXACT, fid, in_port, until))
+            for fid in aggregate.members.keys() - members.keys():
+                table.covered.pop(fid, None)
+            ops.append((DELETE_AGGREGATE, key))
+            self.splits += 1
+            self._decide("split", dpid, key, len(members), now)
+            return ops
+
+    def reject(self, dpid, op, now=None):
+        """The switch rejected the ADD operation `op` sent for `dpid`.
+
+        The rule is forgotten, so the next admit() of its flows installs
+        it again. Returns the flow_ids the rule was dropping.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            table = self._switches.get(dpid)
+            if table is None:
+                return []
+            if op[0] == ADD_EXACT:
+                _, flow_id, in_port, until = op
+                # Una regola sostituita nel frattempo non e' quella respinta
+                if table.exact.get(flow_id) != (in_port, until):
+                    return []
+                table.pop_exact(flow_id)
+                self.rejected += 1
+                return [flow_id]
+            _, key, until = op
+            aggregate = table.aggregates.get(key)
+            if aggregate is None or aggregate.until != until:
+                return []
+            del table.aggregates[key]
+            for flow_id in aggregate.members:
+                table.covered.pop(flow_id, None)
+            self.rejected += 1
+            self._decide("rejected", dpid, key, len(aggregate.members), now)
+            return list(aggregate.members)
+
+    def reset(self, dpid):
+        """Forget the rules of a switch that (re)connected."""
+        with self.lock:
+            self._switches.pop(dpid, None)
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            return {
+                "budget": self.budget,
+                "compactions": self.compactions,
+                "splits": self.splits,
+                "over_budget": self.over_budget,
+                "rejected": self.rejected,
+                "switches": {
+                    str(dpid): {
+                        "rules": len(table),
+                        "exact": len(table.exact),
+                        "aggregates": [
+                            {
+                                "rule": list(key),
+                                "members": len(aggregate.members),
+                                "expires_in": max(aggregate.until - now, 0.0),
+                            }
+                            for key, aggregate in table.aggregates.items()
+                        ],
+                    }
+                    for dpid, table in self._switches.items()
+                },
+                "decisions": list(self.decisions),
+            }
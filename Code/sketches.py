@@ -0,0 +1,184 @@
+import math
+import time
+from array import array
+
+
+class CountMinSketch:
+    """Count-Min sketch with a fixed memory budget.
+
+    Estimates never undercount; with width w and depth d the overcount is
+    at most e/w of the total with probability 1 - e^-d.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self._zero = array("q", [0]) * width
+        self._rows = [array("q", self._zero) for _ in range(depth)]
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, epsilon=0.001, delta=0.01):
+        """Size the sketch for overcount <= epsilon * total w.p. 1 - delta."""
+        width = int(math.ceil(math.e / epsilon))
+        depth = int(math.ceil(math.log(1.0 / delta)))
+        return cls(width=width, depth=depth)
+
+    def _slots(self, key):
+        # Double hashing: d indici da un solo hash a 64 bit
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        width = self.width
+        return [(h1 + i * h2) % width for i in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Add `count` to `key` (conservative update); return the new estimate."""
+        slots = self._slots(key)
+        rows = self._rows
+        estimate = min(row[slot] for row, slot in zip(rows, slots)) + count
+        for row, slot in zip(rows, slots):
+            if row[slot] < estimate:
+                row[slot] = estimate
+        self.total += count
+        return estimate
+
+    def estimate(self, key):
+        return min(row[slot] for row, slot in zip(self._rows, self._slots(key)))
+
+    def clear(self):
+        for row in self._rows:
+            row[:] = self._zero
+        self.total = 0
+
+    def memory_bytes(self):
+        return sum(row.itemsize * len(row) for row in self._rows)
+
+
+class HeavyHitterTracker:
+    """Fixed-memory top-k tracker for packet sources.
+
+    Counts live in a Count-Min sketch that is cleared every `epoch`
+    seconds; a candidate table of at most `capacity` keys keeps the sources
+    with the largest estimates. A source is a heavy hitter once its
+    estimate in the current epoch reaches `promote_count`.
+    """
+
+    def __init__(self, width=2048, depth=4, capacity=64, promote_count=10, epoch=10):
+        self.sketch = CountMinSketch(width=width, depth=depth)
+        self.capacity = capacity
+        self.promote_count = promote_count
+        self.epoch = epoch
+        self._epoch_start = time.time()
+        self._candidates = {}
+        self._min_key = None
+        self._min_count = 0
+
+    def _rotate(self, now):
+        if now - self._epoch_start < self.epoch:
+            return
+        self.sketch.clear()
+        self._candidates.clear()
+        self._min_key = None
+        self._min_count = 0
+        self._epoch_start = now
+
+    def _refresh_min(self):
+        if self._candidates:
+            self._min_key = min(self._candidates, key=self._candidates.get)
+            self._min_count = self._candidates[self._min_key]
+        else:
+            self._min_key = None
+            self._min_count = 0
+
+    def update(self, key, now=None):
+        """Count one packet from `key`; return True if it is a heavy hitter."""
+        now = time.time() if now is None else now
+        self._rotate(now)
+        count = self.sketch.add(key)
+
+        candidates = self._candidates
+        if key in candidates:
+            candidates[key] = count
+            if key == self._min_key:
+                self._refresh_min()
+        elif len(candidates) < self.capacity:
+            candidates[key] = count
+            if self._min_key is None or count < self._min_count:
+                self._min_key = key
+                self._min_count = count
+        elif count > self._min_count:
+            del candidates[self._min_key]
+            candidates[key] = count
+            self._refresh_min()
+
+        return count >= self.promote_count
+
+    def top(self, k=10, now=None):
+        """Return up to k (key, packets/s) pairs, heaviest first."""
+        now = time.time() if now is None else now
+        elapsed = max(now - self._epoch_start, 1e-6)
+        ranked = sorted(self._candidates.items(), key=lambda kv: kv[1], reverse=True)
+        return [(key, count / elapsed) for key, count in ranked[:k]]
+
+    def memory_bytes(self):
+        return self.sketch.memory_bytes()
+
+
+def _mix64(value):
+    # splitmix64: hash() degli interi e' l'identita', serve un mescolamento
+    z = (value + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    """Distinct-count estimator in 2^precision one-byte registers.
+
+    The relative standard error is about 1.04 / sqrt(2^precision): 9% with
+    the default 128 registers. The harmonic sum and the number of empty
+    registers are updated with the registers, so estimate() is O(1).
+    """
+
+    __slots__ = ("precision", "registers", "_shift", "_mask", "_sum", "_zeros")
+
+    def __init__(self, precision=7):
+        self.precision = precision
+        m = 1 << precision
+        self.registers = bytearray(m)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self._sum = float(m)  # somma di 2^-registro
+        self._zeros = m
+
+    def add(self, key):
+        h = _mix64(hash(key) & 0xFFFFFFFFFFFFFFFF)
+        index = h >> self._shift
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        old = self.registers[index]
+        if rank > old:
+            self.registers[index] = rank
+            self._sum += 2.0**-rank - 2.0**-old
+            if old == 0:
+                self._zeros -= 1
+
+    def estimate(self):
+        m = len(self.registers)
+        raw = 0.7213 / (1 + 1.079 / m) * m * m / self._sum
+        if raw <= 2.5 * m and self._zeros:
+            # Pochi elementi: linear counting e' piu' preciso
+            return m * math.log(m / self._zeros)
+        return raw
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+    def clear(self):
+        m = len(self.registers)
+        self.registers[:] = bytes(m)
+        self._sum = float(m)
+        self._zeros = m
+
+    def memory_bytes(self):
+        return len(self.registers)
@@ -0,0 +1,163 @@
+import threading
+
+import numpy as np
+
+# Tipi di chiave nel buffer colonnare
+KIND_PORT = 0
+KIND_MAC = 1
+KIND_PROTOCOL = 2
+KIND_NAMES = {KIND_PORT: "ports", KIND_MAC: "macs", KIND_PROTOCOL: "protocols"}
+
+
+class StatsStore:
+    """Columnar time-series store for switch statistics.
+
+    Every (kind, dpid, key) gets an integer id that indexes a row of
+    fixed-length ring buffers holding the last `history` samples of
+    timestamp, byte count, packet count and byte rate. Rows are reused
+    once a key is expired, so memory is bounded by the number of live
+    keys times `history`, and queries over all keys are NumPy
+    expressions instead of loops over nested dicts.
+    """
+
+    def __init__(self, history=64, capacity=1024):
+        self.history = history
+        self.lock = threading.Lock()
+        self._ids = {}  # (kind, dpid, key) -> row
+        self._keys = [None] * capacity
+        self._free = []
+        self._next = 0
+        self.kinds = np.full(capacity, -1, dtype=np.int8)
+        self.dpids = np.zeros(capacity, dtype=np.int64)
+        self.heads = np.zeros(capacity, dtype=np.int64)  # prossimo slot libero
+        self.lengths = np.zeros(capacity, dtype=np.int64)
+        self.timestamps = np.zeros((capacity, history))
+        self.bytes = np.zeros((capacity, history), dtype=np.int64)
+        self.packets = np.zeros((capacity, history), dtype=np.int64)
+        self.rates = np.zeros((capacity, history))
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def capacity(self):
+        return len(self._keys)
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name in ("kinds", "dpids", "heads", "lengths"):
+            old = getattr(self, name)
+            new = np.full(capacity, -1 if name == "kinds" else 0, dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+        for name in ("timestamps", "bytes", "packets", "rates"):
+            old = getattr(self, name)
+            new = np.zeros((capacity, self.history), dtype=old.dtype)
+            new[: len(old)] = old
+            setattr(self, name, new)
+        self._keys.extend([None] * (capacity - len(self._keys)))
+
+    def _row(self, kind, dpid, key):
+        full_key = (kind, dpid, key)
+        row = self._ids.get(full_key)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._next == self.capacity:
+                self._grow()
+            row = self._next
+            self._next += 1
+        self._ids[full_key] = row
+        self._keys[row] = full_key
+        self.kinds[row] = kind
+        self.dpids[row] = dpid
+        self.heads[row] = 0
+        self.lengths[row] = 0
+        return row
+
+    def record(self, kind, dpid, samples, now):
+        """Append one sample per key: `samples` is {key: (bytes, packets, rate)}."""
+        if not samples:
+            return
+        with self.lock:
+            rows = np.fromiter(
+                (self._row(kind, dpid, key) for key in samples),
+                dtype=np.int64,
+                count=len(samples),
+            )
+            values = np.array(list(samples.values()), dtype=np.float64)
+            slots = self.heads[rows]
+            self.timestamps[rows, slots] = now
+            self.bytes[rows, slots] = values[:, 0]
+            self.packets[rows, slots] = values[:, 1]
+            self.rates[rows, slots] = values[:, 2]
+            self.heads[rows] = (slots + 1) % self.history
+            self.lengths[rows] = np.minimum(self.lengths[rows] + 1, self.history)
+
+    def expire(self, older_than):
+        """Release the rows whose newest sample is older than `older_than`."""
+        with self.lock:
+            live = self.kinds >= 0
+            newest = self.timestamps[np.arange(self.capacity), self.heads - 1]
+            stale = np.flatnonzero(live & (newest < older_than))
+            for row in stale.tolist():
+                del self._ids[self._keys[row]]
+                self._keys[row] = None
+                self.kinds[row] = -1
+                self.timestamps[row] = 0
+                self._free.append(row)
+            return len(stale)
+
+    def query(self, dpid=None, kind=None, min_rate=0.0, since=None):
+        """Keys with a rate sample above `min_rate` B/s since `since`.
+
+        Returns a list of ((kind name, dpid, key), peak rate) pairs, e.g.
+        query(dpid=3, min_rate=1e6, since=time.time() - 30).
+        """
+        with self.lock:
+            mask = self.timestamps > (0 if since is None else since)
+            mask &= self.rates > min_rate
+            rows = mask.any(axis=1) & (self.kinds >= 0)
+            if dpid is not None:
+                rows &= self.dpids == dpid
+            if kind is not None:
+                rows &= self.kinds == kind
+            selected = np.flatnonzero(rows)
+            peaks = np.where(mask[selected], self.rates[selected], 0).max(axis=1)
+            keys = [self._keys[row] for row in selected.tolist()]
+        return [
+            ((KIND_NAMES[k], dp, key), float(peak))
+            for (k, dp, key), peak in zip(keys, peaks.tolist())
+        ]
+
+    def series(self, kind, dpid, key):
+        """Samples of one key, oldest first, as a dict of arrays (or None)."""
+        with self.lock:
+            row = self._ids.get((kind, dpid, key))
+            if row is None:
+                return None
+            length = self.lengths[row]
+            order = (self.heads[row] - length + np.arange(length)) % self.history
+            return {
+                "timestamps": self.timestamps[row, order],
+                "bytes": self.bytes[row, order],
+                "packets": self.packets[row, order],
+                "rates": self.rates[row, order],
+            }
+
+    def memory_bytes(self):
+        return sum(
+            getattr(self, name).nbytes
+            for name in (
+                "kinds",
+                "dpids",
+                "heads",
+                "lengths",
+                "timestamps",
+                "bytes",
+                "packets",
+                "rates",
+            )
+        )
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Tests for AdaptiveThresholdPlugin
+A throughput spike over the key's recent baseline must be flagged
+"""
+
+import numpy as np
+
+from detector import AdaptiveThresholdPlugin
+
+
+def feed(plugin, samples, key="tcp_10.0.0.1_10.0.0.2"):
+    """Feed one sample per cycle; return the anomalies of each cycle."""
+    return [
+        plugin.analyze({key: {"throughput": float(value)}}, now=cycle)
+        for cycle, value in enumerate(samples)
+    ]
+
+
+def test_spike_over_flat_baseline_is_flagged():
+    plugin = AdaptiveThresholdPlugin(window=10, std_factor=3)
+    results = feed(plugin, [0] * 10 + [1e9])
+    assert not any(results[:-1])
+    assert [a["key"] for a in results[-1]] == ["tcp_10.0.0.1_10.0.0.2"]
+    assert results[-1][0]["mean"] == 0
+
+
+def test_spike_over_noisy_baseline_is_flagged():
+    rng = np.random.default_rng(0)
+    baseline = rng.normal(1000, 50, 10)
+    plugin = AdaptiveThresholdPlugin(window=10, std_factor=3)
+    results = feed(plugin, list(baseline) + [1000 * 10000])
+    assert len(results[-1]) == 1
+
+
+def test_noise_within_band_is_not_flagged():
+    plugin = AdaptiveThresholdPlugin(window=10, std_factor=3)
+    results = feed(plugin, [1000, 1100] * 10)
+    assert not any(results)
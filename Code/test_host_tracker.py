@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for HostTracker
+A host's ingress must not follow its frames across transit switches
+"""
+
+from host_tracker import HostTracker
+
+H1 = "00:00:00:00:00:01"
+H2 = "00:00:00:00:00:02"
+
+
+def tracker():
+    """h1 on s1:1, h2 on s1:4; s1:2-s2:2, s2:3-s3:2, s1:3-s3:3."""
+    hosts = HostTracker()
+    hosts.learn(1, 1, H1, "10.0.0.1")
+    hosts.learn(2, 2, H1)
+    hosts.learn(3, 2, H1)
+    hosts.learn(1, 4, H2, "10.0.0.2")
+    hosts.learn(3, 3, H2)
+    return hosts
+
+
+def test_new_path_through_transit_switch_keeps_ingress():
+    hosts = tracker()
+    # h1 arriva su s3 dal link diretto con s1 invece che da s2
+    hosts.learn(3, 3, H1)
+    assert hosts.locate(ip="10.0.0.1") == (1, 1)
+    assert hosts.stats()["moves"] == 0
+
+
+def test_move_to_edge_port_is_followed():
+    hosts = tracker()
+    hosts.learn(3, 5, H1)
+    assert hosts.locate(mac=H1) == (3, 5)
+    assert hosts.stats()["moves"] == 1
+
+
+def test_move_on_ingress_switch_is_followed():
+    hosts = tracker()
+    hosts.learn(1, 6, H2)
+    assert hosts.locate(ip="10.0.0.2") == (1, 6)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Tests for RuleCompactor
+A switch over budget must not re-examine its table at every new block
+"""
+
+from rule_compaction import ADD_AGGREGATE, RuleCompactor
+
+
+def flow(i, mac=None):
+    """A flow with its own source MAC and source /24, unless `mac` is given."""
+    mac = mac or f"00:00:00:00:{i // 256:02x}:{i % 256:02x}"
+    return (mac, "00:00:00:00:ff:ff", f"10.{i // 256}.{i % 256}.1", None, None, None)
+
+
+def test_over_budget_is_one_decision_per_episode():
+    compactor = RuleCompactor(budget=10, min_group=4)
+    for i in range(200):
+        compactor.admit(1, flow(i), 1, until=100, now=0)
+    stats = compactor.stats(now=0)
+    assert stats["over_budget"] == 1
+    assert [d["action"] for d in stats["decisions"]] == ["over_budget"]
+    assert stats["switches"]["1"]["exact"] == 200
+
+
+def test_group_formed_while_over_budget_is_compacted():
+    compactor = RuleCompactor(budget=10, min_group=4)
+    for i in range(20):
+        compactor.admit(1, flow(i), 1, until=100, now=0)
+    attacker = "00:00:00:00:aa:aa"
+    ops = []
+    for i in range(100, 104):
+        ops = compactor.admit(1, flow(i, mac=attacker), 1, until=100, now=0)
+    assert (ADD_AGGREGATE, ("eth_src", 1, attacker), 100) in ops
+    stats = compactor.stats(now=0)
+    assert stats["compactions"] == 1
+    assert stats["over_budget"] == 1
+    assert stats["switches"]["1"]["exact"] == 20
+
+
+def test_new_episode_after_back_under_budget():
+    compactor = RuleCompactor(budget=10, min_group=4)
+    for i in range(12):
+        compactor.admit(1, flow(i), 1, until=100, now=0)
+    for i in range(12):
+        compactor.release(1, flow(i), now=0)
+    for i in range(12, 24):
+        compactor.admit(1, flow(i), 1, until=100, now=0)
+    assert compactor.stats(now=0)["over_budget"] == 2
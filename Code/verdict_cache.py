@@ -0,0 +1,111 @@
+from collections import OrderedDict, deque
+
+
+class VerdictCache:
+    """Bounded LRU cache of block/allow verdicts.
+
+    Entries are tagged with the generation of the blocking state they were
+    computed from; bumping the generation invalidates every cached verdict
+    at once without touching the entries. Each verdict also carries an
+    expiry so blocks lapse on time even without a state change.
+
+    Verdicts are stored under a group (the flow they were computed for),
+    and discard(group) invalidates just that group: writer threads only
+    append the group to a queue, and the thread using the cache marks it
+    on its next get or put, so the cache itself is never touched
+    concurrently. Entries of a discarded group are dropped lazily when
+    looked up.
+    """
+
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.discarded = 0
+        # chiave -> (generazione, verdetto, scadenza, gruppo, sequenza)
+        self._entries = OrderedDict()
+        self._stale = deque()  # gruppi invalidati dagli scrittori
+        self._dropped = {}  # gruppo -> sequenza dell'ultimo discard
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self):
+        """Invalidate all cached verdicts (blocking state changed)."""
+        self.generation += 1
+
+    def discard(self, group):
+        """Invalidate the verdicts of `group`; safe from any thread.
+
+        Call it after changing the state the group's verdicts depend on.
+        """
+        if len(self._stale) >= self.max_entries:
+            # Troppe invalidazioni in sospeso: conviene invalidare tutto
+            self.invalidate()
+        else:
+            self._stale.append(group)
+
+    def _drain(self):
+        stale = self._stale
+        dropped = self._dropped
+        self._seq += 1
+        while stale:
+            dropped[stale.popleft()] = self._seq
+            self.discarded += 1
+        if len(dropped) > self.max_entries:
+            # I verdetti piu' vecchi dell'ultimo discard vanno comunque persi
+            dropped.clear()
+            self.invalidate()
+
+    def get(self, key, now):
+        """Return the cached verdict for `key`, or None on a miss.
+
+        A hit is a (blocked,) tuple so that a cached allow is distinguishable
+        from a miss.
+        """
+        if self._stale:
+            self._drain()
+        entry = self._entries.get(key)
+        if entry is not None:
+            generation, blocked, expires, group, seq = entry
+            if (
+                generation == self.generation
+                and expires > now
+                and self._dropped.get(group, 0) <= seq
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return (blocked,)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, blocked, expires, generation, group=None):
+        """Store a verdict computed while the state was at `generation`."""
+        if generation != self.generation:
+            return  # Stato cambiato durante la valutazione: non cacheare
+        entries = self._entries
+        # Un discard ancora in coda lo invalida (sequenza successiva)
+        entries[key] = (generation, blocked, expires, group, self._seq)
+        entries.move_to_end(key)
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        if self._stale:
+            self._drain()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "generation": self.generation,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "discarded": self.discarded,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }